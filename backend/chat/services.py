@@ -4,9 +4,19 @@ Manages communication with Ollama for text generation with document context.
 """
 import requests
 import json
+from requests.adapters import HTTPAdapter
 from typing import List, Dict, Generator
 from django.conf import settings
 
+# Streams are parsed one NDJSON line per token; use orjson's C parser when
+# installed, otherwise the standard library
+try:
+    import orjson
+    
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 
 class OllamaService:
     """Service for interacting with Ollama API"""
@@ -17,11 +27,22 @@ class OllamaService:
         self.model = config.get('model', 'phi3:mini')
         self.temperature = config.get('temperature', 0.7)
         self.max_tokens = config.get('max_tokens', 2048)
+        # Keep the model (and its prompt-prefix KV cache) loaded between requests
+        self.keep_alive = config.get('keep_alive', '30m')
+        # Fixed context window, large enough for assembled context plus the answer;
+        # a changing num_ctx would make Ollama reload the model
+        self.num_ctx = config.get('num_ctx', 8192)
+        
+        # Reuse keep-alive connections instead of reconnecting per request
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
     
     def is_available(self) -> bool:
         """Check if Ollama service is running"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=2)
+            response = self._session.get(f"{self.base_url}/api/tags", timeout=2)
             return response.status_code == 200
         except:
             return False
@@ -29,7 +50,7 @@ class OllamaService:
     def list_models(self) -> List[str]:
         """List available Ollama models"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
+            response = self._session.get(f"{self.base_url}/api/tags")
             if response.status_code == 200:
                 data = response.json()
                 return [model['name'] for model in data.get('models', [])]
@@ -55,9 +76,11 @@ class OllamaService:
             "model": self.model,
             "prompt": prompt,
             "stream": stream,
+            "keep_alive": self.keep_alive,
             "options": {
                 "temperature": self.temperature,
                 "num_predict": self.max_tokens,
+                "num_ctx": self.num_ctx,
             }
         }
         
@@ -65,7 +88,7 @@ class OllamaService:
             payload["system"] = system_prompt
         
         try:
-            response =requests.post(url, json=payload, stream=stream, timeout=60)
+            response = self._session.post(url, json=payload, stream=stream, timeout=60)
             
             if stream:
                 return self._stream_response(response)
@@ -79,10 +102,10 @@ class OllamaService:
     
     def _stream_response(self, response) -> Generator[str, None, None]:
         """Stream response chunks from Ollama"""
-        for line in response.iter_lines():
+        for line in response.iter_lines(chunk_size=None, delimiter=b"\n"):
             if line:
                 try:
-                    data = json.loads(line)
+                    data = _json_loads(line)
                     if 'response' in data:
                         yield data['response']
                     if data.get('done', False):
@@ -111,14 +134,16 @@ class OllamaService:
             "model": self.model,
             "messages": messages,
             "stream": stream,
+            "keep_alive": self.keep_alive,
             "options": {
                 "temperature": self.temperature,
                 "num_predict": self.max_tokens,
+                "num_ctx": self.num_ctx,
             }
         }
         
         try:
-            response = requests.post(url, json=payload, stream=stream, timeout=120)
+            response = self._session.post(url, json=payload, stream=stream, timeout=120)
             
             if stream:
                 return self._stream_chat_response(response)
@@ -132,10 +157,10 @@ class OllamaService:
     
     def _stream_chat_response(self, response) -> Generator[str, None, None]:
         """Stream chat response chunks from Ollama"""
-        for line in response.iter_lines():
+        for line in response.iter_lines(chunk_size=None, delimiter=b"\n"):
             if line:
                 try:
-                    data = json.loads(line)
+                    data = _json_loads(line)
                     if 'message' in data and 'content' in data['message']:
                         yield data['message']['content']
                     if data.get('done', False):
@@ -143,6 +168,49 @@ class OllamaService:
                 except json.JSONDecodeError:
                     continue
     
+    def generate_cached(
+        self,
+        question: str,
+        context_parts: List[str],
+        prompt: str,
+        system_prompt: str = None,
+        stream: bool = False,
+        question_embedding=None
+    ) -> Generator[str, None, None] | str:
+        """
+        Generate text, reusing a cached answer when a similar question was
+        already answered from the same context.
+        
+        Args:
+            question: User's question (used for similarity matching)
+            context_parts: Context the prompt was built from (must match exactly)
+            prompt: Full prompt to send on a cache miss
+            system_prompt: Optional system instructions
+            stream: Whether to stream the response
+            question_embedding: Precomputed question embedding, if available
+        """
+        from rag.semantic_cache import semantic_cache, context_key
+        
+        key = context_key([self.model, system_prompt or '', *context_parts])
+        try:
+            if question_embedding is None:
+                from rag.embedding_service import embedding_service
+                question_embedding = embedding_service.embed_query(question)
+        except Exception:
+            # No embedding model available; generate without the cache
+            return self.generate(prompt, system_prompt=system_prompt, stream=stream)
+        
+        cached = semantic_cache.get(question_embedding, key)
+        if cached is not None:
+            return iter([cached]) if stream else cached
+        
+        answer = self.generate(prompt, system_prompt=system_prompt, stream=stream)
+        if stream:
+            return semantic_cache.wrap_stream(answer, question_embedding, key)
+        
+        semantic_cache.put(question_embedding, key, answer)
+        return answer
+    
     def generate_with_context(self, question: str, context_chunks: List[str], stream: bool = False):
         """
         Generate response with document context for RAG.
@@ -166,7 +234,7 @@ Question: {question}
 
 Answer based on the sources above:"""
         
-        return self.generate(user_prompt, system_prompt=system_prompt, stream=stream)
+        return self.generate_cached(question, context_chunks, user_prompt, system_prompt=system_prompt, stream=stream)
 
 
 # Global instance
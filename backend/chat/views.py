@@ -249,20 +249,14 @@ class ChatViewSet(viewsets.ViewSet):
             # Check if this is a follow-up question
             is_follow_up = session_memory.is_follow_up_query(conversation.id, message_content)
             
-            # Get relevant chunks using RAG
+            # Get relevant chunks using RAG (follow-ups may reuse previous context)
             if document_ids:
-                retrieved_chunks = rag_service.retrieve(
+                retrieved_chunks = rag_service.retrieve_or_reuse(
                     query=message_content,
+                    conversation_id=conversation.id,
                     doc_ids=document_ids,
                     k=10 if is_follow_up else None  # More context for follow-ups
                 )
-                
-                # For follow-ups, merge with previous context
-                if is_follow_up:
-                    retrieved_chunks = session_memory.get_context_for_follow_up(
-                        conversation.id,
-                        retrieved_chunks
-                    )
             else:
                 retrieved_chunks = []
             
@@ -284,7 +278,8 @@ class ChatViewSet(viewsets.ViewSet):
                 rag_response = rag_service.query(
                     question=message_content,
                     doc_ids=document_ids,
-                    stream=False
+                    stream=False,
+                    chunks=retrieved_chunks
                 )
                 response_text = rag_response.answer
             else:
@@ -372,7 +367,8 @@ class ChatViewSet(viewsets.ViewSet):
                     rag_response = rag_service.query(
                         question=message_content,
                         doc_ids=document_ids,
-                        stream=True
+                        stream=True,
+                        chunks=retrieved_chunks
                     )
                     
                     # rag_response.answer is a generator when streaming
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-15 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generatedcontent',
+            index=models.Index(fields=['content_type', '-created_at'], name='gen_content_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generationqueue',
+            index=models.Index(fields=['status', 'created_at'], name='gen_queue_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generationqueue',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='gen_queue_pending_idx'),
+        ),
+    ]
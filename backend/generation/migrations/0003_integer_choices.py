@@ -0,0 +1,81 @@
+# Generated by Django 5.0.14 on 2026-10-15 22:56
+
+from django.db import migrations, models
+
+CONTENT_TYPES = {'image': '0', 'audio': '1', 'video': '2'}
+STATUSES = {'pending': '0', 'processing': '1', 'completed': '2', 'failed': '3'}
+
+
+def _recode(apps, mapping_for):
+    """Rewrite char columns through {field: {old: new}} mappings"""
+    for model_name, fields in mapping_for.items():
+        model = apps.get_model('generation', model_name)
+        for field, mapping in fields.items():
+            for old, new in mapping.items():
+                model.objects.filter(**{field: old}).update(**{field: new})
+            unknown = model.objects.exclude(**{f'{field}__in': list(mapping.values())})
+            if unknown.exists():
+                raise ValueError(f"{model_name}.{field} has unmapped values: {set(unknown.values_list(field, flat=True))}")
+
+
+def to_codes(apps, schema_editor):
+    """Store choice strings as integer codes (still text until the column changes)"""
+    _recode(apps, {
+        'generatedcontent': {'content_type': CONTENT_TYPES},
+        'generationqueue': {'content_type': CONTENT_TYPES, 'status': STATUSES},
+    })
+
+
+def to_strings(apps, schema_editor):
+    """Restore choice strings from integer codes"""
+    invert = lambda mapping: {code: name for name, code in mapping.items()}
+    _recode(apps, {
+        'generatedcontent': {'content_type': invert(CONTENT_TYPES)},
+        'generationqueue': {'content_type': invert(CONTENT_TYPES), 'status': invert(STATUSES)},
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0002_generatedcontent_gen_content_type_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='generationqueue',
+            name='gen_queue_pending_idx',
+        ),
+        migrations.RunPython(to_codes, to_strings),
+        migrations.AlterField(
+            model_name='generatedcontent',
+            name='content_type',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Image'), (1, 'Audio'), (2, 'Video')]),
+        ),
+        migrations.AlterField(
+            model_name='generationqueue',
+            name='content_type',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Image'), (1, 'Audio'), (2, 'Video')]),
+        ),
+        migrations.AlterField(
+            model_name='generationqueue',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Processing'), (2, 'Completed'), (3, 'Failed')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='generationqueue',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['created_at'], name='gen_queue_pending_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='generatedcontent',
+            constraint=models.CheckConstraint(check=models.Q(('content_type__in', [0, 1, 2])), name='gc_content_type_valid'),
+        ),
+        migrations.AddConstraint(
+            model_name='generationqueue',
+            constraint=models.CheckConstraint(check=models.Q(('status__in', [0, 1, 2, 3])), name='gq_status_valid'),
+        ),
+        migrations.AddConstraint(
+            model_name='generationqueue',
+            constraint=models.CheckConstraint(check=models.Q(('content_type__in', [0, 1, 2])), name='gq_content_type_valid'),
+        ),
+    ]
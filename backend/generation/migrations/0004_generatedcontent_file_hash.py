@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-15 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0003_integer_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedcontent',
+            name='file_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.14 on 2026-10-15 22:59
+
+import msgpack
+from django.db import migrations, models
+
+
+def to_msgpack(apps, schema_editor):
+    """Encode JSON params into the msgpack column"""
+    GenerationQueue = apps.get_model('generation', 'GenerationQueue')
+    for item in GenerationQueue.objects.only('pk', 'params').iterator():
+        item._params_raw = msgpack.packb(item.params or {}, use_bin_type=True)
+        item.save(update_fields=['_params_raw'])
+
+
+def to_json(apps, schema_editor):
+    """Decode the msgpack column back into JSON params"""
+    GenerationQueue = apps.get_model('generation', 'GenerationQueue')
+    for item in GenerationQueue.objects.only('pk', '_params_raw').iterator():
+        item.params = msgpack.unpackb(bytes(item._params_raw), raw=False)
+        item.save(update_fields=['params'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0004_generatedcontent_file_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationqueue',
+            name='_params_raw',
+            field=models.BinaryField(default=b'\x80'),
+        ),
+        migrations.RunPython(to_msgpack, to_json),
+        migrations.RemoveField(
+            model_name='generationqueue',
+            name='params',
+        ),
+    ]
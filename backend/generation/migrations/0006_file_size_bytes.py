@@ -0,0 +1,42 @@
+# Generated by Django 5.0.14 on 2026-10-15 23:05
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Round
+
+MB = 1024 * 1024
+
+
+def mb_to_bytes(apps, schema_editor):
+    """Convert stored MB floats to whole bytes"""
+    GeneratedContent = apps.get_model('generation', 'GeneratedContent')
+    GeneratedContent.objects.update(
+        file_size_bytes=Cast(Round(models.F('file_size_mb') * MB), models.BigIntegerField())
+    )
+
+
+def bytes_to_mb(apps, schema_editor):
+    """Convert whole bytes back to MB floats"""
+    GeneratedContent = apps.get_model('generation', 'GeneratedContent')
+    GeneratedContent.objects.update(
+        file_size_mb=Cast(models.F('file_size_bytes'), models.FloatField()) / MB
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0005_queue_params_msgpack'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedcontent',
+            name='file_size_bytes',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(mb_to_bytes, bytes_to_mb),
+        migrations.RemoveField(
+            model_name='generatedcontent',
+            name='file_size_mb',
+        ),
+    ]
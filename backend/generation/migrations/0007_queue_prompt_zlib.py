@@ -0,0 +1,47 @@
+# Generated by Django 5.0.14 on 2026-10-15 23:14
+
+import zlib
+
+from django.db import migrations, models
+
+
+def compress_prompts(apps, schema_editor):
+    """Move prompt text into the compressed column"""
+    GenerationQueue = apps.get_model('generation', 'GenerationQueue')
+    for item in GenerationQueue.objects.only('pk', 'prompt').iterator():
+        item._prompt_raw = zlib.compress(item.prompt.encode('utf-8'))
+        item.save(update_fields=['_prompt_raw'])
+
+
+def decompress_prompts(apps, schema_editor):
+    """Restore prompt text from the compressed column"""
+    GenerationQueue = apps.get_model('generation', 'GenerationQueue')
+    for item in GenerationQueue.objects.only('pk', '_prompt_raw').iterator():
+        item.prompt = zlib.decompress(item._prompt_raw).decode('utf-8')
+        item.save(update_fields=['prompt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0006_file_size_bytes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationqueue',
+            name='_prompt_raw',
+            field=models.BinaryField(default=b'x\x9c\x03\x00\x00\x00\x00\x01'),
+        ),
+        # Lets a reverse migration re-add the column to existing rows
+        migrations.AlterField(
+            model_name='generationqueue',
+            name='prompt',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(compress_prompts, decompress_prompts),
+        migrations.RemoveField(
+            model_name='generationqueue',
+            name='prompt',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-15 23:03
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0007_queue_prompt_zlib'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='generatedcontent',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False),
+        ),
+        migrations.AlterField(
+            model_name='generationqueue',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-15 23:31
+
+from django.db import migrations, models
+
+
+def empty_to_null(apps, schema_editor):
+    """Store empty params as SQL NULL"""
+    GeneratedContent = apps.get_model('generation', 'GeneratedContent')
+    GeneratedContent.objects.filter(_generation_params={}).update(_generation_params=None)
+
+
+def null_to_empty(apps, schema_editor):
+    """Restore empty params as '{}'"""
+    GeneratedContent = apps.get_model('generation', 'GeneratedContent')
+    GeneratedContent.objects.filter(_generation_params__isnull=True).update(_generation_params={})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0008_created_at_db_default'),
+    ]
+
+    operations = [
+        # Same column, exposed to Python under a private name
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name='generatedcontent',
+                    old_name='generation_params',
+                    new_name='_generation_params',
+                ),
+                migrations.AlterField(
+                    model_name='generatedcontent',
+                    name='_generation_params',
+                    field=models.JSONField(db_column='generation_params', default=dict),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='generatedcontent',
+            name='_generation_params',
+            field=models.JSONField(blank=True, db_column='generation_params', null=True),
+        ),
+        migrations.RunPython(empty_to_null, null_to_empty),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-15 23:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0009_generation_params_nullable'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='generationqueue',
+            name='generated_content',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='generation.generatedcontent'),
+        ),
+    ]
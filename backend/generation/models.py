@@ -1,41 +1,151 @@
-from django.db import models
+import hashlib
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import cached_property
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+import msgpack
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, models, transaction
+from django.db.models.functions import Now
+from django.utils import timezone
+
+
+class ContentType(models.IntegerChoices):
+    """Kind of generated media"""
+    IMAGE = 0, 'Image'
+    AUDIO = 1, 'Audio'
+    VIDEO = 2, 'Video'
+
+
+class QueueStatus(models.IntegerChoices):
+    """Lifecycle of a queued generation task"""
+    PENDING = 0, 'Pending'
+    PROCESSING = 1, 'Processing'
+    COMPLETED = 2, 'Completed'
+    FAILED = 3, 'Failed'
+
+
+# Read size for files that can't be hashed directly
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(f) -> str:
+    """
+    SHA-256 hex digest of a Django File/FieldFile, saved or not.
+    
+    In-memory files are hashed straight from their buffer; disk files are read
+    into one reused buffer with the GIL released, instead of a new bytes
+    object per chunk.
+    """
+    # Stored files are opened here and must not be left open
+    opened = f.closed
+    f.open('rb')
+    raw = getattr(f.file, 'file', f.file)
+    try:
+        return hashlib.file_digest(raw, 'sha256').hexdigest()
+    except (AttributeError, ValueError):
+        # Python < 3.11 (no file_digest), text-mode or non-readinto streams
+        digest = hashlib.sha256()
+        for chunk in f.chunks(chunk_size=HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        return digest.hexdigest()
+    finally:
+        if opened:
+            f.close()
 
 
 class GeneratedContent(models.Model):
     """
     Stores generated multimedia content (images, audio, video).
     """
-    CONTENT_TYPES = [
-        ('image', 'Image'),
-        ('audio', 'Audio'),
-        ('video', 'Video'),
-    ]
-    
-    content_type = models.CharField(max_length=10, choices=CONTENT_TYPES)
+    # Small integer codes keep rows narrow; labels via get_content_type_display()
+    content_type = models.PositiveSmallIntegerField(choices=ContentType.choices)
     prompt = models.TextField()  # User's prompt
     file = models.FileField(upload_to='generated/')
+    # SHA-256 of the file; identical outputs share one stored file
+    file_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
     
     # Generation parameters
     model_used = models.CharField(max_length=255)
-    generation_params = models.JSONField(default=dict)  # Store all params
+    # Store all params; NULL when empty, read through generation_params
+    _generation_params = models.JSONField(null=True, blank=True, db_column='generation_params')
     
-    # Metadata
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Metadata; stamped by the database so bulk inserts don't bind it per row
+    created_at = models.DateTimeField(db_default=Now(), editable=False)
     generation_time = models.FloatField(default=0)  # Seconds
-    file_size_mb = models.FloatField(default=0)
+    file_size_bytes = models.PositiveBigIntegerField(default=0)
     
     # Optional: Link to source documents if generated from doc context
     source_prompt_context = models.TextField(blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Listing by type, newest first
+            models.Index(fields=['content_type', '-created_at'], name='gen_content_type_created_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(content_type__in=ContentType.values),
+                name='gc_content_type_valid'
+            ),
+        ]
     
     def __str__(self):
-        return f"{self.content_type} - {self.prompt[:50]}..."
+        return f"{self.get_content_type_display()} - {self.prompt[:50]}..."
+    
+    def save(self, *args, **kwargs):
+        """Record the file's size and hash once, reusing stored copies of identical content"""
+        if self.file and not self.file_size_bytes:
+            # In-memory size for new files, one storage stat() for stored ones
+            self.file_size_bytes = self.file.size
+        
+        if self.file and not self.file_hash:
+            self.file_hash = file_sha256(self.file)
+            
+            # Files not yet written to storage can point at an existing copy
+            if not self.file._committed:
+                existing = (
+                    GeneratedContent.objects
+                    .filter(file_hash=self.file_hash)
+                    .values_list('file', flat=True)
+                    .first()
+                )
+                if existing:
+                    # A committed name makes FileField skip the write
+                    self.file = existing
+        
+        if not self._generation_params:
+            # Store SQL NULL rather than '{}'
+            self._generation_params = None
+        
+        super().save(*args, **kwargs)
+        # Saving may have renamed or swapped the stored file
+        self.__dict__.pop('file_url', None)
+    
+    @property
+    def generation_params(self) -> dict:
+        """Generation parameters, allocated on first access"""
+        if self._generation_params is None:
+            self._generation_params = {}
+        return self._generation_params
+    
+    @generation_params.setter
+    def generation_params(self, value: dict):
+        self._generation_params = value or None
     
     @property
+    def file_size_mb(self) -> float:
+        """File size in MB"""
+        return self.file_size_bytes / (1024 * 1024)
+    
+    @cached_property
     def file_url(self):
-        """Get URL for the generated file"""
+        """Get URL for the generated file (computed once per instance)"""
         if self.file:
             return self.file.url
         return None
@@ -45,34 +155,291 @@ class GenerationQueue(models.Model):
     """
     Queue for managing generation tasks (useful for batch processing).
     """
-    STATUS_CHOICES = [
-        ('pending', 'Pending'),
-        ('processing', 'Processing'),
-        ('completed', 'Completed'),
-        ('failed', 'Failed'),
-    ]
+    content_type = models.PositiveSmallIntegerField(choices=ContentType.choices)
+    # zlib-compressed UTF-8 prompt; use the prompt property
+    _prompt_raw = models.BinaryField(default=zlib.compress(b''))
+    # msgpack-encoded params (b"\x80" is an empty map); use the params property
+    _params_raw = models.BinaryField(default=b"\x80")
     
-    content_type = models.CharField(max_length=10)
-    prompt = models.TextField()
-    params = models.JSONField(default=dict)
-    
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    status = models.PositiveSmallIntegerField(choices=QueueStatus.choices, default=QueueStatus.PENDING)
     error_message = models.TextField(blank=True)
     
-    # Result
+    # Result; no DB constraint, index or delete cascade. Deleting content
+    # leaves a dangling id until prune() runs, so access can raise DoesNotExist
     generated_content = models.ForeignKey(
         GeneratedContent, 
-        on_delete=models.SET_NULL, 
+        on_delete=models.DO_NOTHING, 
+        db_constraint=False,
+        db_index=False,
         null=True, 
         blank=True
     )
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Stamped by the database, see GeneratedContent.created_at
+    created_at = models.DateTimeField(db_default=Now(), editable=False)
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='gen_queue_status_created_idx'),
+            # Only unfinished rows, for the dispatcher's oldest-pending-first scan
+            models.Index(
+                fields=['created_at'],
+                name='gen_queue_pending_idx',
+                condition=models.Q(status=QueueStatus.PENDING)
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(status__in=QueueStatus.values),
+                name='gq_status_valid'
+            ),
+            models.CheckConstraint(
+                check=models.Q(content_type__in=ContentType.values),
+                name='gq_content_type_valid'
+            ),
+        ]
     
     def __str__(self):
-        return f"{self.content_type} - {self.status}"
+        return f"{self.get_content_type_display()} - {self.get_status_display()}"
+    
+    @property
+    def prompt(self) -> str:
+        """Prompt text, decompressed on access"""
+        return zlib.decompress(self._prompt_raw).decode('utf-8')
+    
+    @prompt.setter
+    def prompt(self, value: str):
+        self._prompt_raw = zlib.compress(value.encode('utf-8'))
+    
+    @property
+    def params(self) -> dict:
+        """Generation parameters, decoded from msgpack on access"""
+        # BinaryField hands back memoryview from some backends
+        return msgpack.unpackb(bytes(self._params_raw), raw=False)
+    
+    @params.setter
+    def params(self, value: dict):
+        self._params_raw = msgpack.packb(value, use_bin_type=True)
+    
+    @classmethod
+    def poll_pending(cls, limit: int = 500, chunk_size: int = 100) -> Iterator['GenerationQueue']:
+        """
+        Stream the oldest pending tasks without their prompt/params blobs.
+        
+        Rows are fetched chunk_size at a time (server-side cursor where
+        supported); pass the chosen pks to claim() to take them with their
+        payload.
+        """
+        return (
+            cls.objects
+            .filter(status=QueueStatus.PENDING)
+            .only('id', 'content_type', 'status', 'created_at')
+            .order_by('created_at')[:limit]
+            .iterator(chunk_size=chunk_size)
+        )
+    
+    @classmethod
+    def prune(cls, older_than: timedelta) -> int:
+        """Delete completed tasks older than older_than whose result is gone"""
+        cutoff = timezone.now() - older_than
+        deleted, _ = (
+            cls.objects
+            .filter(status=QueueStatus.COMPLETED, completed_at__lt=cutoff)
+            .exclude(generated_content_id__in=GeneratedContent.objects.values('pk'))
+            .delete()
+        )
+        return deleted
+    
+    @classmethod
+    def claim(cls, n: int = 1, pks: Sequence[int] = None) -> List['GenerationQueue']:
+        """
+        Claim the oldest n pending tasks for this worker, marking them processing.
+        
+        pks restricts the claim to chosen rows (e.g. from poll_pending());
+        any already taken by another worker are left out.
+        
+        Rows locked by another worker are skipped rather than waited on
+        (databases without SKIP LOCKED, like SQLite, serialize the transaction).
+        Long-running workers should call django.db.close_old_connections()
+        before each poll so persistent connections get recycled.
+        """
+        pending = cls.objects.filter(status=QueueStatus.PENDING)
+        if pks is not None:
+            pending = pending.filter(pk__in=pks)
+        
+        with transaction.atomic():
+            items = list(
+                pending
+                .select_for_update(skip_locked=True)
+                .order_by('created_at')[:n]
+            )
+            if not items:
+                return []
+            
+            started_at = timezone.now()
+            cls.objects.filter(pk__in=[item.pk for item in items]).update(
+                status=QueueStatus.PROCESSING,
+                started_at=started_at
+            )
+            for item in items:
+                item.status = QueueStatus.PROCESSING
+                item.started_at = started_at
+            return items
+
+
+# Bulk write helpers
+
+def _bulk_batch_size() -> int:
+    """Rows per statement for bulk writes (GEN_BULK_BATCH_SIZE overrides config)"""
+    config = getattr(settings, 'APP_CONFIG', {}).get('generation', {})
+    return int(os.getenv('GEN_BULK_BATCH_SIZE', config.get('bulk_batch_size', 500)))
+
+
+def bulk_create_generated(
+    objs: Iterable[GeneratedContent],
+    batch_size: int = None,
+    ignore_conflicts: bool = False
+) -> List[GeneratedContent]:
+    """Insert GeneratedContent rows in batched INSERTs"""
+    return GeneratedContent.objects.bulk_create(
+        objs,
+        batch_size=batch_size or _bulk_batch_size(),
+        ignore_conflicts=ignore_conflicts
+    )
+
+
+def bulk_create_queue(
+    objs: Iterable[GenerationQueue],
+    batch_size: int = None,
+    ignore_conflicts: bool = False
+) -> List[GenerationQueue]:
+    """Insert GenerationQueue rows in batched INSERTs"""
+    return GenerationQueue.objects.bulk_create(
+        objs,
+        batch_size=batch_size or _bulk_batch_size(),
+        ignore_conflicts=ignore_conflicts
+    )
+
+
+@transaction.atomic
+def bulk_ingest(queue_items: Iterable[GenerationQueue]) -> List[GenerationQueue]:
+    """
+    Enqueue many generation tasks in one transaction.
+    
+    Rows that conflict with existing ones are skipped; with ignore_conflicts
+    the returned objects don't get primary keys set.
+    """
+    return bulk_create_queue(queue_items, ignore_conflicts=True)
+
+
+def copy_load_generated(objs: Iterable[GeneratedContent], batch_size: int = None) -> int:
+    """
+    Load GeneratedContent rows with PostgreSQL COPY, returning the row count.
+    
+    COPY skips per-row statement parsing and planning; created_at and the
+    primary key come from column defaults. Other backends (and psycopg2)
+    fall back to batched bulk_create. Like bulk_create, save() isn't called,
+    so file_hash and file_size_bytes must already be set.
+    """
+    # Cursor.copy() is psycopg 3 only
+    if connection.vendor != 'postgresql' or connection.Database.__name__ != 'psycopg':
+        return len(bulk_create_generated(objs, batch_size=batch_size))
+    
+    opts = GeneratedContent._meta
+    fields = [
+        f for f in opts.concrete_fields
+        if not f.primary_key and f.db_default is models.NOT_PROVIDED
+    ]
+    sql = 'COPY {} ({}) FROM STDIN'.format(
+        connection.ops.quote_name(opts.db_table),
+        ', '.join(connection.ops.quote_name(f.column) for f in fields)
+    )
+    
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        with cursor.cursor.copy(sql) as copy:
+            for obj in objs:
+                copy.write_row([
+                    f.get_db_prep_save(f.pre_save(obj, True), connection)
+                    for f in fields
+                ])
+                count += 1
+    return count
+
+
+def bulk_update_queue(
+    items: Sequence[GenerationQueue],
+    fields: Sequence[str] = ('status', 'started_at', 'completed_at', 'error_message'),
+    batch_size: int = None
+) -> int:
+    """Write status changes for many queue items in batched UPDATEs"""
+    with transaction.atomic():
+        return GenerationQueue.objects.bulk_update(
+            items,
+            list(fields),
+            batch_size=batch_size or _bulk_batch_size()
+        )
+
+
+def _stat_and_hash(path: str) -> Tuple[int, str]:
+    """Size in bytes and SHA-256 hex digest of a local file"""
+    with open(path, 'rb') as f:
+        return os.fstat(f.fileno()).st_size, file_sha256(File(f))
+
+
+def register_batch(
+    paths: Sequence[str],
+    prompts: Sequence[str],
+    content_type: int,
+    model_used: str,
+    generation_params: dict = None,
+    workers: int = 16
+) -> List[GeneratedContent]:
+    """
+    Store many locally generated files and create their rows in bulk.
+    
+    Files are stat'ed and hashed concurrently (reads and hashing release the
+    GIL); content already stored, or repeated within the batch, is saved
+    once and shared, as in GeneratedContent.save().
+    """
+    field = GeneratedContent._meta.get_field('file')
+    
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        stats = list(ex.map(_stat_and_hash, paths))
+        
+        hashes = {digest for _, digest in stats}
+        stored = dict(
+            GeneratedContent.objects
+            .filter(file_hash__in=hashes)
+            .values_list('file_hash', 'file')
+        )
+        
+        # First path for each hash that still needs writing to storage
+        pending = {}
+        for path, (_, digest) in zip(paths, stats):
+            if digest not in stored:
+                pending.setdefault(digest, path)
+        
+        def store(path):
+            with open(path, 'rb') as f:
+                name = field.generate_filename(None, os.path.basename(path))
+                return field.storage.save(name, File(f), max_length=field.max_length)
+        
+        stored.update(zip(pending, ex.map(store, pending.values())))
+    
+    return bulk_create_generated([
+        GeneratedContent(
+            content_type=content_type,
+            prompt=prompt,
+            file=stored[digest],
+            file_hash=digest,
+            file_size_bytes=size,
+            model_used=model_used,
+            # Each row gets its own dict
+            generation_params=dict(generation_params or {})
+        )
+        for prompt, (size, digest) in zip(prompts, stats)
+    ])
@@ -1,3 +1,376 @@
-from django.test import TestCase
+"""
+Tests for generation models
+"""
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+
+
+class MediaTestCase(TestCase):
+    """TestCase storing media files in a temporary directory"""
+    
+    def setUp(self):
+        """Point media storage at a temporary directory"""
+        self.media_root = tempfile.mkdtemp()
+        self.source_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+    
+    def tearDown(self):
+        """Restore media storage and remove temporary files"""
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        shutil.rmtree(self.source_dir, ignore_errors=True)
+    
+    def stored_files(self):
+        """Names of files in the generated media directory"""
+        return sorted(os.listdir(os.path.join(self.media_root, 'generated')))
+
+
+class GeneratedContentTest(MediaTestCase):
+    """Test GeneratedContent storage behaviour"""
+    
+    def test_identical_content_shares_file(self):
+        """Test that saving identical content reuses the stored file"""
+        import hashlib
+        from django.core.files.base import ContentFile
+        from generation.models import ContentType, GeneratedContent
+        
+        first = GeneratedContent(
+            content_type=ContentType.IMAGE, prompt='a', model_used='sd',
+            file=ContentFile(b'pixels', name='a.png')
+        )
+        first.save()
+        second = GeneratedContent(
+            content_type=ContentType.IMAGE, prompt='b', model_used='sd',
+            file=ContentFile(b'pixels', name='b.png')
+        )
+        second.save()
+        
+        self.assertEqual(first.file_hash, hashlib.sha256(b'pixels').hexdigest())
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertEqual(self.stored_files(), ['a.png'])
+    
+    def test_stored_file_hashed_and_closed(self):
+        """Test that hashing a stored file closes the handle it opened"""
+        from django.core.files.base import ContentFile
+        from generation.models import ContentType, GeneratedContent
+        
+        content = GeneratedContent(
+            content_type=ContentType.IMAGE, prompt='a', model_used='sd',
+            file=ContentFile(b'pixels', name='a.png')
+        )
+        content.save()
+        
+        # Rows saved before hashing existed
+        GeneratedContent.objects.filter(pk=content.pk).update(file_hash=None)
+        legacy = GeneratedContent.objects.get(pk=content.pk)
+        legacy.save()
+        
+        self.assertEqual(legacy.file_hash, content.file_hash)
+        self.assertTrue(legacy.file.closed)
+    
+    def test_file_size_recorded(self):
+        """Test that save() records the exact size in bytes"""
+        from django.core.files.base import ContentFile
+        from generation.models import ContentType, GeneratedContent
+        
+        content = GeneratedContent(
+            content_type=ContentType.AUDIO, prompt='a', model_used='tts',
+            file=ContentFile(b'x' * 1536, name='a.wav')
+        )
+        content.save()
+        
+        content = GeneratedContent.objects.get(pk=content.pk)
+        self.assertEqual(content.file_size_bytes, 1536)
+        self.assertAlmostEqual(content.file_size_mb, 1536 / (1024 * 1024))
+    
+    def test_empty_params_stored_as_null(self):
+        """Test that generation_params is allocated lazily and empty params are NULL"""
+        from django.core.files.base import ContentFile
+        from generation.models import ContentType, GeneratedContent
+        
+        content = GeneratedContent(
+            content_type=ContentType.AUDIO, prompt='a', model_used='tts',
+            file=ContentFile(b'audio', name='a.wav')
+        )
+        self.assertIsNone(content._generation_params)
+        content.save()
+        self.assertTrue(GeneratedContent.objects.filter(pk=content.pk, _generation_params__isnull=True).exists())
+        
+        # In-place edits persist
+        content.generation_params['voice'] = 'en'
+        content.save()
+        self.assertEqual(GeneratedContent.objects.get(pk=content.pk).generation_params, {'voice': 'en'})
+    
+    def test_file_url_cached_until_save(self):
+        """Test that file_url is computed once and refreshed by save()"""
+        from django.core.files.base import ContentFile
+        from generation.models import ContentType, GeneratedContent
+        
+        content = GeneratedContent(content_type=ContentType.IMAGE, prompt='a', model_used='sd')
+        self.assertIsNone(content.file_url)
+        
+        content.file = ContentFile(b'pixels', name='a.png')
+        content.save()
+        self.assertTrue(content.file_url.endswith('generated/a.png'))
+
+
+class GenerationQueueTest(TestCase):
+    """Test GenerationQueue encoding, claiming and pruning"""
+    
+    def _enqueue(self, n):
+        """Create n pending image tasks with prompts p0..pn-1"""
+        from generation.models import ContentType, GenerationQueue
+        
+        return [
+            GenerationQueue.objects.create(content_type=ContentType.IMAGE, prompt=f'p{i}')
+            for i in range(n)
+        ]
+    
+    def test_params_round_trip(self):
+        """Test that msgpack params survive a reload"""
+        from generation.models import ContentType, GenerationQueue
+        
+        item = GenerationQueue.objects.create(
+            content_type=ContentType.VIDEO, prompt='clip',
+            params={'steps': 30, 'size': [512, 512], 'seed': None, 'name': 'café'}
+        )
+        item = GenerationQueue.objects.get(pk=item.pk)
+        
+        self.assertEqual(item.params, {'steps': 30, 'size': [512, 512], 'seed': None, 'name': 'café'})
+        self.assertEqual(GenerationQueue(content_type=ContentType.IMAGE).params, {})
+    
+    def test_claim_oldest_pending(self):
+        """Test that claims take pending rows oldest first, never twice"""
+        from generation.models import GenerationQueue, QueueStatus
+        
+        items = self._enqueue(5)
+        
+        first = GenerationQueue.claim(2)
+        self.assertEqual([item.prompt for item in first], ['p0', 'p1'])
+        self.assertTrue(all(item.status == QueueStatus.PROCESSING and item.started_at for item in first))
+        
+        # Chosen rows that were already claimed are left out
+        chosen = GenerationQueue.claim(10, pks=[items[1].pk, items[3].pk])
+        self.assertEqual([item.prompt for item in chosen], ['p3'])
+        
+        self.assertEqual([item.prompt for item in GenerationQueue.claim(10)], ['p2', 'p4'])
+        self.assertEqual(GenerationQueue.claim(), [])
+    
+    def test_prompt_round_trip(self):
+        """Test that compressed prompts survive a reload"""
+        from generation.models import ContentType, GenerationQueue
+        
+        item = GenerationQueue.objects.create(content_type=ContentType.VIDEO, prompt='A café at dusk ' * 20)
+        item = GenerationQueue.objects.get(pk=item.pk)
+        
+        self.assertEqual(item.prompt, 'A café at dusk ' * 20)
+        self.assertLess(len(item._prompt_raw), len(item.prompt))
+        self.assertEqual(GenerationQueue(content_type=ContentType.IMAGE).prompt, '')
+    
+    def test_prune_missing_results(self):
+        """Test that prune drops old completed tasks with NULL or deleted results"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from generation.models import ContentType, GeneratedContent, GenerationQueue, QueueStatus
+        
+        kept, deleted = [
+            GeneratedContent.objects.create(
+                content_type=ContentType.IMAGE, prompt=name, model_used='sd',
+                file=f'generated/{name}.png', file_hash=name, file_size_bytes=1
+            )
+            for name in ('kept', 'deleted')
+        ]
+        old = timezone.now() - timedelta(days=2)
+        for prompt, result, status, completed_at in [
+            ('live', kept, QueueStatus.COMPLETED, old),
+            ('dangling', deleted, QueueStatus.COMPLETED, old),
+            ('null', None, QueueStatus.COMPLETED, old),
+            ('recent', None, QueueStatus.COMPLETED, timezone.now()),
+            ('failed', None, QueueStatus.FAILED, old),
+        ]:
+            GenerationQueue.objects.create(
+                content_type=ContentType.IMAGE, prompt=prompt,
+                generated_content=result, status=status, completed_at=completed_at
+            )
+        
+        # No cascade: the queue row keeps the deleted id
+        deleted.delete()
+        self.assertEqual(GenerationQueue.objects.filter(generated_content_id__isnull=False).count(), 2)
+        
+        self.assertEqual(GenerationQueue.prune(timedelta(days=1)), 2)
+        self.assertEqual(
+            sorted(item.prompt for item in GenerationQueue.objects.all()),
+            ['failed', 'live', 'recent']
+        )
+    
+    def test_poll_pending_defers_payload(self):
+        """Test that polling skips prompt and params until claimed"""
+        from generation.models import GenerationQueue
+        
+        self._enqueue(4)
+        
+        polled = list(GenerationQueue.poll_pending(limit=3, chunk_size=2))
+        self.assertEqual(len(polled), 3)
+        self.assertIn('_prompt_raw', polled[0].get_deferred_fields())
+        self.assertIn('_params_raw', polled[0].get_deferred_fields())
+        
+        claimed = GenerationQueue.claim(10, pks=[item.pk for item in polled])
+        self.assertEqual([item.prompt for item in claimed], ['p0', 'p1', 'p2'])
+
+
+class GenerationMigrationTest(TransactionTestCase):
+    """Test that generation data migrations convert existing rows both ways"""
+    
+    def _migrate(self, name):
+        """Migrate generation to name, returning the historical apps at that state"""
+        target = [('generation', name)]
+        MigrationExecutor(connection).migrate(target)
+        return MigrationExecutor(connection).loader.project_state(target).apps
+    
+    def tearDown(self):
+        """Leave the schema at the latest migration"""
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes('generation'))
+    
+    def test_integer_choices(self):
+        """Test that 0003 maps choice strings to integer codes and back"""
+        before, after = '0002_generatedcontent_gen_content_type_created_idx_and_more', '0003_integer_choices'
+        
+        apps = self._migrate(before)
+        apps.get_model('generation', 'GeneratedContent').objects.create(
+            content_type='video', prompt='clip', file='generated/clip.mp4', model_used='m'
+        )
+        apps.get_model('generation', 'GenerationQueue').objects.create(
+            content_type='audio', prompt='p', status='completed'
+        )
+        
+        apps = self._migrate(after)
+        self.assertEqual(apps.get_model('generation', 'GeneratedContent').objects.get().content_type, 2)
+        item = apps.get_model('generation', 'GenerationQueue').objects.get()
+        self.assertEqual((item.content_type, item.status), (1, 2))
+        
+        apps = self._migrate(before)
+        self.assertEqual(apps.get_model('generation', 'GeneratedContent').objects.get().content_type, 'video')
+        item = apps.get_model('generation', 'GenerationQueue').objects.get()
+        self.assertEqual((item.content_type, item.status), ('audio', 'completed'))
+    
+    def test_params_msgpack(self):
+        """Test that 0005 packs queue params with msgpack and back"""
+        import msgpack
+        before, after = '0004_generatedcontent_file_hash', '0005_queue_params_msgpack'
+        
+        apps = self._migrate(before)
+        apps.get_model('generation', 'GenerationQueue').objects.create(
+            content_type=1, prompt='p', params={'voice': 'en', 'speed': 1.5}
+        )
+        
+        apps = self._migrate(after)
+        item = apps.get_model('generation', 'GenerationQueue').objects.get()
+        self.assertEqual(msgpack.unpackb(bytes(item._params_raw)), {'voice': 'en', 'speed': 1.5})
+        
+        apps = self._migrate(before)
+        item = apps.get_model('generation', 'GenerationQueue').objects.get()
+        self.assertEqual(item.params, {'voice': 'en', 'speed': 1.5})
+    
+    def test_file_size_bytes(self):
+        """Test that 0006 converts MB floats to whole bytes and back"""
+        before, after = '0005_queue_params_msgpack', '0006_file_size_bytes'
+        
+        apps = self._migrate(before)
+        apps.get_model('generation', 'GeneratedContent').objects.create(
+            content_type=2, prompt='clip', file='generated/clip.mp4', model_used='m', file_size_mb=1.5
+        )
+        
+        apps = self._migrate(after)
+        self.assertEqual(apps.get_model('generation', 'GeneratedContent').objects.get().file_size_bytes, 1572864)
+        
+        apps = self._migrate(before)
+        self.assertEqual(apps.get_model('generation', 'GeneratedContent').objects.get().file_size_mb, 1.5)
+    
+    def test_prompt_zlib(self):
+        """Test that 0007 compresses queue prompts and back"""
+        import zlib
+        before, after = '0006_file_size_bytes', '0007_queue_prompt_zlib'
+        
+        apps = self._migrate(before)
+        apps.get_model('generation', 'GenerationQueue').objects.create(content_type=1, prompt='Say hi')
+        
+        apps = self._migrate(after)
+        item = apps.get_model('generation', 'GenerationQueue').objects.get()
+        self.assertEqual(zlib.decompress(item._prompt_raw).decode('utf-8'), 'Say hi')
+        
+        apps = self._migrate(before)
+        self.assertEqual(apps.get_model('generation', 'GenerationQueue').objects.get().prompt, 'Say hi')
+    
+    def test_empty_params_null(self):
+        """Test that 0009 stores empty generation params as NULL and back"""
+        before, after = '0008_created_at_db_default', '0009_generation_params_nullable'
+        
+        apps = self._migrate(before)
+        GeneratedContent = apps.get_model('generation', 'GeneratedContent')
+        for prompt, params in [('empty', {}), ('steps', {'steps': 4})]:
+            GeneratedContent.objects.create(
+                content_type=0, prompt=prompt, file=f'generated/{prompt}.png',
+                model_used='m', generation_params=params
+            )
+        
+        apps = self._migrate(after)
+        GeneratedContent = apps.get_model('generation', 'GeneratedContent')
+        self.assertIsNone(GeneratedContent.objects.get(prompt='empty')._generation_params)
+        self.assertEqual(GeneratedContent.objects.get(prompt='steps')._generation_params, {'steps': 4})
+        
+        apps = self._migrate(before)
+        GeneratedContent = apps.get_model('generation', 'GeneratedContent')
+        self.assertEqual(GeneratedContent.objects.get(prompt='empty').generation_params, {})
+
+
+class RegisterBatchTest(MediaTestCase):
+    """Test bulk registration of generated files"""
+    
+    def _write(self, name, data):
+        """Write a source file for registration"""
+        path = os.path.join(self.source_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+    
+    def test_identical_files_stored_once(self):
+        """Test that repeated and already stored content shares one file"""
+        from django.core.files.base import ContentFile
+        from generation.models import ContentType, GeneratedContent, register_batch
+        
+        GeneratedContent(
+            content_type=ContentType.IMAGE, prompt='old', model_used='sd',
+            file=ContentFile(b'old', name='old.png')
+        ).save()
+        
+        paths = [
+            self._write('a.png', b'old'),
+            self._write('b.png', b'new'),
+            self._write('c.png', b'new'),
+        ]
+        rows = register_batch(paths, ['a', 'b', 'c'], ContentType.IMAGE, 'sd', {'steps': 20})
+        
+        self.assertEqual(rows[0].file.name, 'generated/old.png')
+        self.assertEqual(rows[1].file.name, rows[2].file.name)
+        self.assertEqual([row.file_size_bytes for row in rows], [3, 3, 3])
+        self.assertEqual(len(self.stored_files()), 2)
+        self.assertEqual(GeneratedContent.objects.get(prompt='c').file.read(), b'new')
+    
+    def test_params_not_shared(self):
+        """Test that rows don't share one generation_params dict"""
+        from generation.models import ContentType, register_batch
+        
+        paths = [self._write('a.png', b'a'), self._write('b.png', b'b')]
+        params = {'steps': 20}
+        rows = register_batch(paths, ['a', 'b'], ContentType.IMAGE, 'sd', params)
+        
+        rows[0].generation_params['steps'] = 50
+        self.assertEqual(rows[1].generation_params, {'steps': 20})
+        self.assertEqual(params, {'steps': 20})
@@ -3,12 +3,12 @@ Semantic Chunking Service for RAG Pipeline
 Splits documents into meaningful chunks while preserving tables and structure.
 """
 import re
-from typing import List, Tuple, Optional
+from typing import Iterator, List, Tuple, Optional
 from dataclasses import dataclass
 from django.conf import settings
 
 
-@dataclass
+@dataclass(slots=True)
 class Chunk:
     """Represents a document chunk with metadata"""
     text: str
@@ -37,6 +37,7 @@ class SemanticChunker:
     )
     HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.+)$', re.MULTILINE)
     PAGE_PATTERN = re.compile(r'^---\s*Page\s*(\d+)\s*---\s*$', re.MULTILINE)
+    PARAGRAPH_PATTERN = re.compile(r'\n\n+')
     
     def __init__(
         self,
@@ -80,6 +81,13 @@ class SemanticChunker:
             # Rough estimation: ~4 chars per token
             return len(text) // 4
     
+    def _count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """Count tokens for many texts in one tokenizer call"""
+        tokenizer = self._get_tokenizer()
+        if tokenizer:
+            return [len(tokens) for tokens in tokenizer.encode_batch(texts)]
+        return [len(text) // 4 for text in texts]
+    
     def _extract_tables(self, text: str) -> List[Tuple[int, int, str]]:
         """
         Find all markdown tables in text.
@@ -184,16 +192,34 @@ class SemanticChunker:
         Returns:
             List of Chunk objects
         """
+        return list(self.iter_chunks(text))
+    
+    def iter_chunks(self, text: str) -> Iterator[Chunk]:
+        """
+        Lazily split text into semantic chunks.
+        
+        Args:
+            text: Full document text (markdown format preferred)
+            
+        Yields:
+            Chunk objects in document order
+        """
         if not text or not text.strip():
-            return []
+            return
         
         # Extract page markers
         pages = self._extract_page_numbers(text)
         
+        # Plain prose needs no table protection or heading tracking
+        has_tables = '|' in text and self.TABLE_PATTERN.search(text) is not None
+        has_headings = '#' in text and self.HEADING_PATTERN.search(text) is not None
+        if not has_tables and not has_headings:
+            yield from self._iter_plain_text_chunks(text, pages)
+            return
+        
         # Split into segments at natural boundaries
         segments = self._split_at_boundaries(text)
         
-        chunks = []
         current_chunk_segments = []
         current_tokens = 0
         chunk_index = 0
@@ -210,7 +236,7 @@ class SemanticChunker:
                     start_char = text.find(current_chunk_segments[0])
                     end_char = start_char + len(chunk_text)
                     
-                    chunks.append(Chunk(
+                    yield Chunk(
                         text=chunk_text,
                         chunk_index=chunk_index,
                         start_char=start_char,
@@ -219,14 +245,14 @@ class SemanticChunker:
                         chunk_type="text",
                         section_title=self._find_section_title(text, start_char),
                         token_count=current_tokens
-                    ))
+                    )
                     chunk_index += 1
                     current_chunk_segments = []
                     current_tokens = 0
                 
                 # Add table as its own chunk
                 start_char = text.find(segment)
-                chunks.append(Chunk(
+                yield Chunk(
                     text=segment,
                     chunk_index=chunk_index,
                     start_char=start_char,
@@ -235,7 +261,7 @@ class SemanticChunker:
                     chunk_type="table",
                     section_title=self._find_section_title(text, start_char),
                     token_count=segment_tokens
-                ))
+                )
                 chunk_index += 1
                 continue
             
@@ -246,7 +272,7 @@ class SemanticChunker:
                 start_char = text.find(current_chunk_segments[0])
                 end_char = start_char + len(chunk_text)
                 
-                chunks.append(Chunk(
+                yield Chunk(
                     text=chunk_text,
                     chunk_index=chunk_index,
                     start_char=start_char,
@@ -255,7 +281,7 @@ class SemanticChunker:
                     chunk_type="text",
                     section_title=self._find_section_title(text, start_char),
                     token_count=current_tokens
-                ))
+                )
                 chunk_index += 1
                 
                 # Calculate overlap
@@ -284,7 +310,7 @@ class SemanticChunker:
             start_char = text.find(current_chunk_segments[0])
             end_char = start_char + len(chunk_text)
             
-            chunks.append(Chunk(
+            yield Chunk(
                 text=chunk_text,
                 chunk_index=chunk_index,
                 start_char=start_char,
@@ -293,9 +319,70 @@ class SemanticChunker:
                 chunk_type="text",
                 section_title=self._find_section_title(text, start_char),
                 token_count=current_tokens
-            ))
+            )
+    
+    def _iter_plain_text_chunks(self, text: str, pages: List[Tuple[int, int]]) -> Iterator[Chunk]:
+        """
+        Fast path of iter_chunks for text without tables or headings.
+        
+        Splits on paragraphs and greedily packs them by token count, using
+        one batched tokenizer call for all paragraphs.
+        """
+        segments = [seg.strip() for seg in self.PARAGRAPH_PATTERN.split(text)]
+        segments = [seg for seg in segments if seg]
+        segment_tokens = self._count_tokens_batch(segments)
+        
+        current = []  # Indices into segments
+        current_tokens = 0
+        chunk_index = 0
+        
+        for i, tokens in enumerate(segment_tokens):
+            if current_tokens + tokens > self.max_tokens and current:
+                yield self._make_plain_chunk(text, segments, current, current_tokens, chunk_index, pages)
+                chunk_index += 1
+                
+                # Carry trailing segments over as overlap
+                overlap_tokens = int(current_tokens * self.overlap_percent)
+                overlap = []
+                overlap_count = 0
+                for j in reversed(current):
+                    if overlap_count + segment_tokens[j] <= overlap_tokens:
+                        overlap.insert(0, j)
+                        overlap_count += segment_tokens[j]
+                    else:
+                        break
+                
+                current = overlap
+                current_tokens = overlap_count
+            
+            current.append(i)
+            current_tokens += tokens
         
-        return chunks
+        if current:
+            yield self._make_plain_chunk(text, segments, current, current_tokens, chunk_index, pages)
+    
+    def _make_plain_chunk(
+        self,
+        text: str,
+        segments: List[str],
+        indices: List[int],
+        token_count: int,
+        chunk_index: int,
+        pages: List[Tuple[int, int]]
+    ) -> Chunk:
+        """Build a text chunk from the given paragraph indices"""
+        chunk_text = "\n\n".join(segments[i] for i in indices)
+        start_char = text.find(segments[indices[0]])
+        return Chunk(
+            text=chunk_text,
+            chunk_index=chunk_index,
+            start_char=start_char,
+            end_char=start_char + len(chunk_text),
+            page_number=self._get_page_at_position(start_char, pages),
+            chunk_type="text",
+            section_title=None,
+            token_count=token_count
+        )
     
     def chunk_with_metadata(
         self, 
@@ -314,10 +401,27 @@ class SemanticChunker:
         Returns:
             List of chunk dictionaries ready for database storage
         """
-        chunks = self.chunk_text(text)
+        return list(self.iter_chunks_with_metadata(text, doc_id, base_chunk_id))
+    
+    def iter_chunks_with_metadata(
+        self,
+        text: str,
+        doc_id: int,
+        base_chunk_id: int = 0
+    ) -> Iterator[dict]:
+        """
+        Lazily chunk text, yielding storage-ready dictionaries.
         
-        return [
-            {
+        Args:
+            text: Document text
+            doc_id: Document ID
+            base_chunk_id: Starting chunk ID
+            
+        Yields:
+            Chunk dictionaries ready for database storage
+        """
+        for chunk in self.iter_chunks(text):
+            yield {
                 'doc_id': doc_id,
                 'chunk_id': base_chunk_id + chunk.chunk_index,
                 'chunk_index': chunk.chunk_index,
@@ -329,8 +433,6 @@ class SemanticChunker:
                 'section_title': chunk.section_title,
                 'token_count': chunk.token_count,
             }
-            for chunk in chunks
-        ]
 
 
 # Global instance
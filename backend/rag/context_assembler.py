@@ -2,12 +2,11 @@
 Context Assembler for RAG Pipeline
 Assembles retrieved chunks into coherent context for LLM.
 """
-import re
-from typing import List, Dict, Optional, Set
+from typing import List, Dict, Optional, Set, FrozenSet, Tuple
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class AssembledContext:
     """Result of context assembly"""
     context_text: str
@@ -39,34 +38,63 @@ class ContextAssembler:
         from django.conf import settings
         config = getattr(settings, 'APP_CONFIG', {}).get('retrieval', {})
         self.max_tokens = max_tokens or config.get('max_context_tokens', self.DEFAULT_MAX_TOKENS)
+        
+        # Lazy load tokenizer
+        self._tokenizer = None
+        self._tokenizer_loaded = False
+    
+    def _get_tokenizer(self):
+        """Lazy load tiktoken tokenizer"""
+        if not self._tokenizer_loaded:
+            try:
+                import tiktoken
+                self._tokenizer = tiktoken.get_encoding("cl100k_base")
+            except ImportError:
+                self._tokenizer = None
+            self._tokenizer_loaded = True
+        return self._tokenizer
     
     def _count_tokens(self, text: str) -> int:
         """Estimate token count"""
-        try:
-            import tiktoken
-            enc = tiktoken.get_encoding("cl100k_base")
-            return len(enc.encode(text))
-        except ImportError:
-            # Rough estimation
-            return len(text) // 4
+        tokenizer = self._get_tokenizer()
+        if tokenizer:
+            return len(tokenizer.encode(text))
+        # Rough estimation
+        return len(text) // 4
+    
+    def _count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """Estimate token counts for many texts in one tokenizer call"""
+        tokenizer = self._get_tokenizer()
+        if tokenizer:
+            return [len(tokens) for tokens in tokenizer.encode_batch(texts)]
+        return [len(text) // 4 for text in texts]
     
-    def _compute_text_hash(self, text: str) -> str:
-        """Compute hash for deduplication"""
-        # Normalize text for comparison
-        normalized = re.sub(r'\s+', ' ', text.lower().strip())
-        # Use first 100 chars as hash key
-        return normalized[:100]
+    # Characters of normalized text used as the dedup key
+    HASH_PREFIX_CHARS = 100
+    
+    def _dedup_keys(self, text: str) -> Tuple[str, FrozenSet[str]]:
+        """Exact-duplicate key and overlap word set from one lowercase split"""
+        words = text.lower().split()
+        # Key is the first 100 chars of the whitespace-collapsed text; every
+        # word adds at least one char, so later words can't reach it
+        text_hash = ' '.join(words[:self.HASH_PREFIX_CHARS])[:self.HASH_PREFIX_CHARS]
+        return text_hash, frozenset(words)
+    
+    def _word_set(self, text: str) -> FrozenSet[str]:
+        """Lowercased word set used for overlap comparison"""
+        return frozenset(text.lower().split())
     
     def _calculate_overlap(self, text1: str, text2: str) -> float:
         """Calculate text overlap ratio"""
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        
+        return self._set_overlap(self._word_set(text1), self._word_set(text2))
+    
+    def _set_overlap(self, words1: FrozenSet[str], words2: FrozenSet[str]) -> float:
+        """Jaccard overlap between two precomputed word sets"""
         if not words1 or not words2:
             return 0.0
         
         intersection = len(words1 & words2)
-        union = len(words1 | words2)
+        union = len(words1) + len(words2) - intersection
         
         return intersection / union if union > 0 else 0.0
     
@@ -90,26 +118,32 @@ class ContextAssembler:
         
         seen_hashes: Set[str] = set()
         unique_chunks = []
+        # Word sets of accepted chunks, built once instead of per comparison
+        unique_word_sets: List[FrozenSet[str]] = []
         
         for chunk in chunks:
-            text = chunk.get('text', '')
-            text_hash = self._compute_text_hash(text)
+            text_hash, words = self._dedup_keys(chunk.get('text', ''))
             
             # Exact duplicate check
             if text_hash in seen_hashes:
                 continue
             
             # Overlap check with existing chunks
+            size = len(words)
             is_duplicate = False
-            for existing in unique_chunks:
-                overlap = self._calculate_overlap(text, existing.get('text', ''))
-                if overlap >= overlap_threshold:
+            for existing_words in unique_word_sets:
+                # Jaccard can never exceed min/max of the set sizes
+                other = len(existing_words)
+                if not size or not other or min(size, other) < overlap_threshold * max(size, other):
+                    continue
+                if self._set_overlap(words, existing_words) >= overlap_threshold:
                     is_duplicate = True
                     break
             
             if not is_duplicate:
                 seen_hashes.add(text_hash)
                 unique_chunks.append(chunk)
+                unique_word_sets.append(words)
         
         return unique_chunks
     
@@ -122,11 +156,13 @@ class ContextAssembler:
         2. Order by page number
         3. Order by chunk index
         """
-        return sorted(chunks, key=lambda c: (
-            c.get('doc_id', 0),
-            c.get('page_number', 0) or 0,
-            c.get('chunk_index', 0)
-        ))
+        return sorted(chunks, key=self._sort_key)
+    
+    @staticmethod
+    def _sort_key(chunk: dict) -> tuple:
+        """Ordering key: document, then page, then chunk index"""
+        get = chunk.get
+        return (get('doc_id', 0), get('page_number', 0) or 0, get('chunk_index', 0))
     
     def _format_chunk(self, chunk: dict, index: int) -> str:
         """
@@ -209,12 +245,22 @@ class ContextAssembler:
         # Sort logically
         sorted_chunks = self._sort_chunks(unique_chunks)
         
+        # Token counts of the raw texts, used to reject chunks before formatting
+        raw_tokens = self._count_tokens_batch([c.get('text', '') for c in sorted_chunks])
+        table_limit = max_tokens * 1.1
+        
         # Assemble within token limit
         context_parts = []
         used_chunks = []
         current_tokens = 0
         
-        for chunk in sorted_chunks:
+        for chunk, text_tokens in zip(sorted_chunks, raw_tokens):
+            # The formatted chunk is never shorter than its text, so a chunk
+            # that overflows on text alone can be rejected without formatting
+            projected = current_tokens + text_tokens
+            if projected > max_tokens and (chunk.get('chunk_type') != 'table' or projected >= table_limit):
+                break
+            
             citation_index = len(used_chunks) + 1
             formatted = self._format_chunk(chunk, citation_index)
             chunk_tokens = self._count_tokens(formatted)
@@ -224,7 +270,7 @@ class ContextAssembler:
                 # Try to fit partial chunk for tables
                 if chunk.get('chunk_type') == 'table':
                     # Tables are important, include if possible
-                    if current_tokens + chunk_tokens < max_tokens * 1.1:
+                    if current_tokens + chunk_tokens < table_limit:
                         context_parts.append(formatted)
                         used_chunks.append(chunk)
                         current_tokens += chunk_tokens
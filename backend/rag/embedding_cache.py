@@ -0,0 +1,157 @@
+"""
+Embedding Cache for RAG Pipeline
+Persists text embeddings keyed by content hash so re-ingesting a document
+(or overlapping text across documents) skips the embedding model.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional
+from django.conf import settings
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed LRU cache mapping sha256(model|text) to an embedding row.
+    - Keys include the model name, so switching models never mixes vectors
+    - Very short texts are not cached (lookup would cost more than encoding)
+    - Least recently used entries are evicted past max_entries
+    """
+    
+    # Texts shorter than this are always re-encoded
+    MIN_TEXT_CHARS = 32
+    
+    def __init__(self, path: Optional[str] = None, max_entries: int = 200_000):
+        """
+        Initialize the cache.
+        
+        Args:
+            path: SQLite file path
+            max_entries: Maximum number of cached embeddings
+        """
+        config = getattr(settings, 'APP_CONFIG', {}).get('embeddings', {})
+        self.path = Path(path or config.get('cache_path', 'data/embedding_cache.sqlite3'))
+        self.max_entries = config.get('cache_max_entries', max_entries)
+        
+        self._lock = threading.Lock()
+        self._conn = None
+        self._count = 0
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """Lazy open the cache database"""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key BLOB PRIMARY KEY, dim INTEGER, vector BLOB, accessed REAL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings(accessed)"
+            )
+            self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return self._conn
+    
+    def make_keys(self, model_name: str, texts: List[str]) -> List[Optional[bytes]]:
+        """
+        Compute cache keys for texts.
+        
+        Returns:
+            One key per text, or None for texts too short to cache
+        """
+        prefix = f"{model_name}|"
+        return [
+            hashlib.sha256((prefix + text).encode('utf-8')).digest()
+            if len(text) >= self.MIN_TEXT_CHARS else None
+            for text in texts
+        ]
+    
+    def get_many(self, keys: List[Optional[bytes]]) -> Dict[bytes, np.ndarray]:
+        """
+        Look up embeddings for the given keys.
+        
+        Returns:
+            Dict of key -> embedding for cache hits only
+        """
+        wanted = list({k for k in keys if k is not None})
+        if not wanted:
+            return {}
+        
+        found = {}
+        with self._lock:
+            conn = self._get_connection()
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(wanted), 500):
+                batch = wanted[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, dim, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32, count=dim)
+            
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET accessed = ? WHERE key = ?",
+                    [(now, k) for k in found]
+                )
+                conn.commit()
+        
+        return found
+    
+    def set_many(self, keys: List[Optional[bytes]], embeddings: np.ndarray):
+        """
+        Store embeddings for the given keys, skipping uncacheable (None) keys.
+        
+        Args:
+            keys: Cache keys aligned with embeddings rows
+            embeddings: Array of shape (n, dim)
+        """
+        now = time.time()
+        rows = [
+            (key, int(vec.shape[0]), np.asarray(vec, dtype=np.float32).tobytes(), now)
+            for key, vec in zip(keys, embeddings)
+            if key is not None
+        ]
+        if not rows:
+            return
+        
+        with self._lock:
+            conn = self._get_connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector, accessed) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._count += len(rows)
+            
+            if self._count > self.max_entries:
+                self._count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                excess = self._count - self.max_entries
+                if excess > 0:
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY accessed LIMIT ?)",
+                        (excess,)
+                    )
+                    self._count -= excess
+            
+            conn.commit()
+    
+    def clear(self):
+        """Remove all cached embeddings"""
+        with self._lock:
+            conn = self._get_connection()
+            conn.execute("DELETE FROM embeddings")
+            conn.commit()
+            self._count = 0
+
+
+# Global instance
+embedding_cache = EmbeddingCache()
@@ -4,12 +4,73 @@ Generates embeddings for document chunks using sentence-transformers.
 Supports multiple embedding models: bge-small-en, nomic-embed-text, e5-small
 """
 import os
+import time
 import numpy as np
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional, Union
 from django.conf import settings
 
 
+def _compile_model(model):
+    """Compile the transformer with torch.compile and warm it up"""
+    import torch
+    
+    if not hasattr(torch, 'compile'):
+        print("[Embedding] torch.compile unavailable, using eager mode")
+        return
+    
+    try:
+        transformer = model[0]
+        transformer.auto_model = torch.compile(
+            transformer.auto_model,
+            mode='reduce-overhead',
+            dynamic=True
+        )
+        # Pay the compilation cost at load time instead of on the first request
+        with torch.inference_mode():
+            model.encode(["warmup"], convert_to_numpy=True, show_progress_bar=False)
+        print("[Embedding] Model compiled with torch.compile")
+    except Exception as e:
+        print(f"[Embedding] torch.compile failed, using eager mode: {e}")
+
+
+@lru_cache(maxsize=4)
+def _load_st_model(
+    model_name: str,
+    device: str,
+    trust_remote: bool,
+    backend: str = 'torch',
+    cache_dir: Optional[str] = None,
+    compile_model: bool = False
+):
+    """
+    Load a SentenceTransformer, cached per (model, device, backend) so that
+    switching between models never reloads one already in memory.
+    """
+    from sentence_transformers import SentenceTransformer
+    
+    print(f"[Embedding] Loading model: {model_name}")
+    
+    model_kwargs = {}
+    if backend != 'torch':
+        model_kwargs['backend'] = backend
+    
+    model = SentenceTransformer(
+        model_name,
+        trust_remote_code=trust_remote,
+        device=device,
+        cache_folder=cache_dir,
+        **model_kwargs
+    )
+    print(f"[Embedding] Using device: {device.upper()}, backend: {backend}")
+    
+    if compile_model and backend == 'torch':
+        _compile_model(model)
+    
+    return model
+
+
 class EmbeddingService:
     """
     Service for generating text embeddings using sentence-transformers.
@@ -24,23 +85,25 @@ class EmbeddingService:
         'minilm': 'sentence-transformers/all-MiniLM-L6-v2',
     }
     
-    # Singleton instance
-    _instance = None
-    _model = None
-    _model_name = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
-    
     def __init__(self):
         """Initialize with config from settings"""
-        if not hasattr(self, '_initialized'):
-            config = getattr(settings, 'APP_CONFIG', {}).get('embeddings', {})
-            self._default_model = config.get('model', 'BAAI/bge-small-en-v1.5')
-            self._batch_size = config.get('batch_size', 32)
-            self._initialized = True
+        config = getattr(settings, 'APP_CONFIG', {}).get('embeddings', {})
+        self._default_model = config.get('model', 'BAAI/bge-small-en-v1.5')
+        self._batch_size = config.get('batch_size', 32)
+        # Probe for a faster batch size unless one is configured explicitly
+        self._autotune = config.get('autotune_batch_size', 'batch_size' not in config)
+        self._tuned_batch_size = None
+        # Inference backend ('torch', 'onnx', 'openvino') and optional torch.compile
+        self._backend = config.get('backend', 'torch')
+        self._compile = config.get('compile', False)
+        self._cache_dir = config.get('cache_dir')
+        # Persist document embeddings by content hash (see embedding_cache)
+        self._use_cache = config.get('cache_enabled', True)
+        self._cache = None
+        
+        # Currently selected model
+        self._model = None
+        self._model_name = None
     
     def _load_model(self, model_name: Optional[str] = None):
         """Lazy load the embedding model"""
@@ -50,15 +113,11 @@ class EmbeddingService:
         if model_to_load in self.SUPPORTED_MODELS:
             model_to_load = self.SUPPORTED_MODELS[model_to_load]
         
-        # Only reload if model changed
+        # Only switch if model changed
         if self._model is not None and self._model_name == model_to_load:
             return self._model
         
         try:
-            from sentence_transformers import SentenceTransformer
-            
-            print(f"[Embedding] Loading model: {model_to_load}")
-            
             # Set trust_remote_code for nomic model
             trust_remote = 'nomic' in model_to_load.lower()
             
@@ -66,15 +125,18 @@ class EmbeddingService:
             import torch
             device = 'cuda' if torch.cuda.is_available() else 'cpu'
             
-            self._model = SentenceTransformer(
+            self._model = _load_st_model(
                 model_to_load,
-                trust_remote_code=trust_remote,
-                device=device
+                device,
+                trust_remote,
+                self._backend,
+                self._cache_dir,
+                self._compile
             )
-            print(f"[Embedding] Using device: {device.upper()}")
             self._model_name = model_to_load
+            self._tuned_batch_size = None
             
-            print(f"[Embedding] Model loaded successfully. Dimension: {self._model.get_sentence_embedding_dimension()}")
+            print(f"[Embedding] Model ready. Dimension: {self._model.get_sentence_embedding_dimension()}")
             
             return self._model
             
@@ -110,12 +172,42 @@ class EmbeddingService:
         embedding = model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
         return embedding
     
+    # Batch sizes tried by the autotune probe, and the smallest input worth probing
+    AUTOTUNE_BATCH_SIZES = (8, 16, 32, 64, 128, 256)
+    AUTOTUNE_MIN_TEXTS = 64
+    
+    def _autotune_batch(self, model, texts: List[str]) -> int:
+        """
+        Pick a batch size by timing a doubling probe on sample texts.
+        
+        Stops as soon as per-item latency stops improving; the result is
+        cached for the lifetime of the loaded model.
+        """
+        import torch
+        
+        best_size = self._batch_size
+        best_per_item = None
+        
+        for size in self.AUTOTUNE_BATCH_SIZES:
+            sample = (texts * (size // len(texts) + 1))[:size]
+            start = time.perf_counter()
+            with torch.inference_mode():
+                model.encode(sample, batch_size=size, convert_to_numpy=True, show_progress_bar=False)
+            per_item = (time.perf_counter() - start) / size
+            
+            if best_per_item is not None and per_item >= best_per_item:
+                break
+            best_size, best_per_item = size, per_item
+        
+        print(f"[Embedding] Autotuned batch size: {best_size}")
+        return best_size
+    
     def embed_texts(
         self, 
         texts: List[str], 
         model_name: Optional[str] = None,
         batch_size: Optional[int] = None,
-        show_progress: bool = True
+        show_progress: Optional[bool] = None
     ) -> np.ndarray:
         """
         Generate embeddings for multiple texts.
@@ -123,8 +215,8 @@ class EmbeddingService:
         Args:
             texts: List of texts to embed
             model_name: Optional model override
-            batch_size: Batch size for encoding
-            show_progress: Show progress bar
+            batch_size: Batch size for encoding (autotuned if not set)
+            show_progress: Show progress bar (defaults to on for 100+ texts)
             
         Returns:
             Numpy array of shape (num_texts, embedding_dim)
@@ -133,20 +225,76 @@ class EmbeddingService:
             return np.array([])
         
         model = self._load_model(model_name)
-        batch_size = batch_size or self._batch_size
+        
+        if show_progress is None:
+            show_progress = len(texts) >= 100
         
         # For e5 models, add instruction prefix
         actual_model = model_name or self._model_name
         if 'e5' in actual_model.lower():
             texts = [f"passage: {t}" for t in texts]
         
-        embeddings = model.encode(
-            texts,
-            batch_size=batch_size,
-            convert_to_numpy=True,
-            normalize_embeddings=True,
-            show_progress_bar=show_progress
+        if not self._use_cache:
+            return self._encode(model, texts, batch_size, show_progress)
+        
+        # Only encode texts whose embedding isn't cached yet
+        cache = self._get_cache()
+        keys = cache.make_keys(self._model_name, texts)
+        cached = cache.get_many(keys)
+        miss_indices = [i for i, key in enumerate(keys) if key not in cached]
+        
+        if not miss_indices:
+            return np.stack([cached[key] for key in keys])
+        
+        miss_embeddings = self._encode(
+            model,
+            [texts[i] for i in miss_indices],
+            batch_size,
+            show_progress
         )
+        cache.set_many([keys[i] for i in miss_indices], miss_embeddings)
+        
+        if len(miss_indices) == len(texts):
+            return miss_embeddings
+        
+        embeddings = np.empty((len(texts), miss_embeddings.shape[1]), dtype=np.float32)
+        embeddings[miss_indices] = miss_embeddings
+        for i, key in enumerate(keys):
+            if key in cached:
+                embeddings[i] = cached[key]
+        
+        return embeddings
+    
+    def _get_cache(self):
+        """Lazy load embedding cache"""
+        if self._cache is None:
+            from .embedding_cache import embedding_cache
+            self._cache = embedding_cache
+        return self._cache
+    
+    def _encode(
+        self,
+        model,
+        texts: List[str],
+        batch_size: Optional[int],
+        show_progress: bool
+    ) -> np.ndarray:
+        """Run the model over texts with the configured or autotuned batch size"""
+        import torch
+        
+        if batch_size is None:
+            if self._autotune and self._tuned_batch_size is None and len(texts) >= self.AUTOTUNE_MIN_TEXTS:
+                self._tuned_batch_size = self._autotune_batch(model, texts[:self.AUTOTUNE_MIN_TEXTS])
+            batch_size = self._tuned_batch_size or self._batch_size
+        
+        with torch.inference_mode():
+            embeddings = model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=show_progress
+            )
         
         return embeddings
     
@@ -162,17 +310,44 @@ class EmbeddingService:
             Numpy array of shape (embedding_dim,)
         """
         model = self._load_model(model_name)
+        query = self._with_query_prefix(query, model_name or self._model_name)
+        
+        embedding = model.encode(query, convert_to_numpy=True, normalize_embeddings=True)
+        return embedding
+    
+    def embed_queries(self, queries: List[str], model_name: Optional[str] = None) -> np.ndarray:
+        """
+        Generate embeddings for several queries in one model call.
+        
+        Args:
+            queries: Query texts to embed
+            model_name: Optional model override
+            
+        Returns:
+            Numpy array of shape (len(queries), embedding_dim)
+        """
+        model = self._load_model(model_name)
         actual_model = model_name or self._model_name
+        texts = [self._with_query_prefix(q, actual_model) for q in queries]
         
+        return model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+    
+    @staticmethod
+    def _with_query_prefix(query: str, model_name: str) -> str:
+        """Apply the model-specific query prefix"""
         # For e5 models, use query prefix
-        if 'e5' in actual_model.lower():
-            query = f"query: {query}"
+        if 'e5' in model_name.lower():
+            return f"query: {query}"
         # For bge models, optionally add instruction
-        elif 'bge' in actual_model.lower():
-            query = f"Represent this sentence for searching relevant passages: {query}"
-        
-        embedding = model.encode(query, convert_to_numpy=True, normalize_embeddings=True)
-        return embedding
+        if 'bge' in model_name.lower():
+            return f"Represent this sentence for searching relevant passages: {query}"
+        return query
     
     def compute_similarity(
         self, 
@@ -204,6 +379,8 @@ class EmbeddingService:
             del self._model
             self._model = None
             self._model_name = None
+            self._tuned_batch_size = None
+            _load_st_model.cache_clear()
             
             # Force garbage collection
             import gc
@@ -219,5 +396,5 @@ class EmbeddingService:
             print("[Embedding] Model unloaded")
 
 
-# Global singleton instance
+# Global instance
 embedding_service = EmbeddingService()
@@ -3,8 +3,10 @@ Query Processor for RAG Pipeline
 Handles query embedding, intent detection, and retrieval depth selection.
 """
 import re
+import threading
+from collections import OrderedDict
 from typing import List, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
 import numpy as np
 
@@ -30,6 +32,48 @@ class ProcessedQuery:
     keywords: List[str] = None
 
 
+# Words ignored when extracting keywords
+_STOPWORDS: frozenset = frozenset({
+    'the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been',
+    'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will',
+    'would', 'could', 'should', 'may', 'might', 'can', 'this',
+    'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it',
+    'we', 'they', 'what', 'which', 'who', 'whom', 'where',
+    'when', 'why', 'how', 'all', 'each', 'every', 'both',
+    'few', 'more', 'most', 'other', 'some', 'such', 'no',
+    'not', 'only', 'same', 'so', 'than', 'too', 'very',
+    'just', 'about', 'into', 'from', 'with', 'for', 'on',
+    'at', 'by', 'to', 'of', 'in', 'and', 'or', 'but',
+    'me', 'my', 'myself', 'our', 'ours', 'your', 'yours',
+})
+
+# Keyword tokens: words of 2+ letters in lowercased text
+_TOKEN_RE = re.compile(r'\b[a-z]{2,}\b')
+
+# Leading filler phrases: a greeting/request opener, then an optional
+# "tell me"-style lead-in (each stripped at most once, in that order)
+_FILLER_RE = re.compile(
+    r'^(?:(?:hey|hi|hello|please|can you|could you|would you|i want you to)\s*,?\s*)?'
+    r'(?:(?:tell me|help me|i need to|i want to)\s*)?',
+    re.IGNORECASE
+)
+
+
+def _compile_intent_regex(intent_patterns: dict) -> re.Pattern:
+    """
+    Combine all intent patterns into one regex with a named group per intent.
+    
+    Each intent is a lookahead alternative anchored at the start of the query,
+    so intents keep their declaration priority no matter where in the query
+    their pattern matches; match.lastgroup names the winning intent.
+    """
+    alternatives = [
+        rf"(?=[\s\S]*?(?P<{intent.name}>{'|'.join(patterns)}))"
+        for intent, patterns in intent_patterns.items()
+    ]
+    return re.compile('|'.join(alternatives))
+
+
 class QueryProcessor:
     """
     Processes user queries for optimal retrieval.
@@ -88,6 +132,8 @@ class QueryProcessor:
         ],
     }
     
+    _INTENT_REGEX = _compile_intent_regex(INTENT_PATTERNS)
+    
     # Default K values by intent
     INTENT_K_VALUES = {
         QueryIntent.SUMMARY: 10,
@@ -98,14 +144,23 @@ class QueryProcessor:
         QueryIntent.QUESTION: 5,
     }
     
-    def __init__(self, embedding_service=None):
+    # Number of processed queries kept in the LRU cache
+    CACHE_SIZE = 128
+    
+    def __init__(self, embedding_service=None, cache_size: int = None):
         """
         Initialize query processor.
         
         Args:
             embedding_service: Optional embedding service for query embedding
+            cache_size: Max processed queries to cache (0 disables caching)
         """
         self._embedding_service = embedding_service
+        
+        # (cleaned_query, embed) -> (ProcessedQuery, embedding model name)
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_size = self.CACHE_SIZE if cache_size is None else cache_size
+        self._cache_lock = threading.Lock()
     
     def _get_embedding_service(self):
         """Lazy load embedding service"""
@@ -124,86 +179,59 @@ class QueryProcessor:
         Returns:
             Cleaned query string
         """
-        # Remove extra whitespace
-        cleaned = ' '.join(query.split())
-        
-        # Remove common filler phrases
-        filler_patterns = [
-            r'^(hey|hi|hello|please|can you|could you|would you|i want you to)\s*,?\s*',
-            r'^(tell me|help me|i need to|i want to)\s*',
-        ]
-        
-        for pattern in filler_patterns:
-            cleaned = re.sub(pattern, '', cleaned, flags=re.IGNORECASE)
+        # Remove extra whitespace, then common filler phrases in one pass
+        cleaned = _FILLER_RE.sub('', ' '.join(query.split()), count=1)
         
         return cleaned.strip()
     
-    def detect_intent(self, query: str) -> QueryIntent:
+    def detect_intent(self, query: str, query_lower: Optional[str] = None) -> QueryIntent:
         """
         Detect the intent of the query.
         
         Args:
             query: User query
+            query_lower: Precomputed query.lower(), if available
             
         Returns:
             QueryIntent enum value
         """
-        query_lower = query.lower()
+        if query_lower is None:
+            query_lower = query.lower()
         
-        for intent, patterns in self.INTENT_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, query_lower):
-                    return intent
+        match = self._INTENT_REGEX.match(query_lower)
+        if match:
+            return QueryIntent[match.lastgroup]
         
         # Default to general question
         return QueryIntent.QUESTION
     
-    def extract_keywords(self, query: str) -> List[str]:
+    def extract_keywords(self, query: str, tokens: Optional[List[str]] = None) -> List[str]:
         """
         Extract important keywords from query.
         
         Args:
             query: User query
+            tokens: Precomputed lowercased word tokens, if available
             
         Returns:
             List of keyword strings
         """
-        # Remove stopwords and extract significant terms
-        stopwords = {
-            'the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been',
-            'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will',
-            'would', 'could', 'should', 'may', 'might', 'can', 'this',
-            'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it',
-            'we', 'they', 'what', 'which', 'who', 'whom', 'where',
-            'when', 'why', 'how', 'all', 'each', 'every', 'both',
-            'few', 'more', 'most', 'other', 'some', 'such', 'no',
-            'not', 'only', 'same', 'so', 'than', 'too', 'very',
-            'just', 'about', 'into', 'from', 'with', 'for', 'on',
-            'at', 'by', 'to', 'of', 'in', 'and', 'or', 'but',
-            'me', 'my', 'myself', 'our', 'ours', 'your', 'yours',
-        }
-        
-        # Tokenize and filter
-        words = re.findall(r'\b[a-zA-Z]{2,}\b', query.lower())
-        keywords = [w for w in words if w not in stopwords]
+        # Tokenize and filter out stopwords
+        if tokens is None:
+            tokens = _TOKEN_RE.findall(query.lower())
+        keywords = [w for w in tokens if w not in _STOPWORDS]
         
         # Return unique keywords preserving order
-        seen = set()
-        unique_keywords = []
-        for kw in keywords:
-            if kw not in seen:
-                seen.add(kw)
-                unique_keywords.append(kw)
-        
-        return unique_keywords
+        return list(dict.fromkeys(keywords))
     
-    def determine_k(self, intent: QueryIntent, query: str) -> int:
+    def determine_k(self, intent: QueryIntent, query: str, word_count: Optional[int] = None) -> int:
         """
         Determine optimal number of chunks to retrieve.
         
         Args:
             intent: Detected query intent
             query: Original query
+            word_count: Precomputed number of words in query, if available
             
         Returns:
             Number of chunks (K) to retrieve
@@ -211,7 +239,8 @@ class QueryProcessor:
         base_k = self.INTENT_K_VALUES.get(intent, 5)
         
         # Adjust based on query complexity
-        word_count = len(query.split())
+        if word_count is None:
+            word_count = len(query.split())
         
         if word_count > 20:
             # Complex query, get more context
@@ -234,16 +263,29 @@ class QueryProcessor:
             ProcessedQuery with all metadata
         """
         cleaned = self.clean_query(query)
-        intent = self.detect_intent(cleaned)
-        keywords = self.extract_keywords(cleaned)
-        k = self.determine_k(intent, cleaned)
+        
+        cached = self._cache_get(cleaned, embed)
+        if cached is not None:
+            return replace(cached, original_query=query)
+        
+        # Lowercase and tokenize once for all analysis steps; cleaned text
+        # is single-space separated, so words are counted from spaces
+        cleaned_lower = cleaned.lower()
+        tokens = _TOKEN_RE.findall(cleaned_lower)
+        word_count = cleaned.count(' ') + 1 if cleaned else 0
+        
+        intent = self.detect_intent(cleaned, cleaned_lower)
+        keywords = self.extract_keywords(cleaned, tokens)
+        k = self.determine_k(intent, cleaned, word_count)
         
         embedding = None
         if embed:
             service = self._get_embedding_service()
             embedding = service.embed_query(cleaned)
+            # Cached results are shared, so the vector must not be mutated
+            embedding.flags.writeable = False
         
-        return ProcessedQuery(
+        processed = ProcessedQuery(
             original_query=query,
             cleaned_query=cleaned,
             intent=intent,
@@ -251,6 +293,51 @@ class QueryProcessor:
             query_embedding=embedding,
             keywords=keywords
         )
+        self._cache_put(cleaned, embed, processed)
+        
+        return processed
+    
+    def _embedding_model_name(self, embed: bool) -> Optional[str]:
+        """Model the cached embedding belongs to (None when not embedding)"""
+        if not embed:
+            return None
+        return self._get_embedding_service()._model_name
+    
+    def _cache_get(self, cleaned: str, embed: bool) -> Optional[ProcessedQuery]:
+        """Look up a processed query, refreshing its LRU position"""
+        if not self._cache_size:
+            return None
+        
+        key = (cleaned, embed)
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            
+            processed, model_name = entry
+            # Embeddings from a previously loaded model are stale
+            if model_name != self._embedding_model_name(embed):
+                del self._cache[key]
+                return None
+            
+            self._cache.move_to_end(key)
+            return processed
+    
+    def _cache_put(self, cleaned: str, embed: bool, processed: ProcessedQuery):
+        """Store a processed query, evicting the least recently used"""
+        if not self._cache_size:
+            return
+        
+        with self._cache_lock:
+            self._cache[(cleaned, embed)] = (processed, self._embedding_model_name(embed))
+            self._cache.move_to_end((cleaned, embed))
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+    
+    def clear_cache(self):
+        """Drop all cached processed queries (e.g. after a model reload)"""
+        with self._cache_lock:
+            self._cache.clear()
 
 
 # Global instance
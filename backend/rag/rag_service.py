@@ -2,9 +2,19 @@
 Main RAG Service Orchestrator
 Coordinates the full RAG pipeline: ingestion, embedding, retrieval, and generation.
 """
+import hashlib
+import queue
+import threading
+import time
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Optional, Dict, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+
+
+# Single background worker so vector store saves never overlap
+_SAVE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='vector-store-save')
 
 
 @dataclass
@@ -17,6 +27,139 @@ class RAGResponse:
     model_used: str
 
 
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire after a fixed time-to-live.
+    Thread-safe; expired entries are dropped lazily on access.
+    """
+    
+    def __init__(self, maxsize: int = 512, ttl: float = 1800):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
+
+
+def _quantize_embedding(embedding: np.ndarray, dtype: str = 'float16'):
+    """
+    Compact an embedding for caching.
+    
+    Returns:
+        Tuple of (values, scale); scale is None unless dtype is 'int8'
+    """
+    if dtype == 'int8':
+        scale = float(np.max(np.abs(embedding))) / 127 or 1.0
+        return np.round(embedding / scale).astype(np.int8), scale
+    return embedding.astype(dtype), None
+
+
+def _dequantize_embedding(entry) -> np.ndarray:
+    """Restore a float32 embedding from _quantize_embedding output"""
+    values, scale = entry
+    if scale is None:
+        return values.astype(np.float32, copy=False)
+    return values.astype(np.float32) * np.float32(scale)
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-query embedding requests into batched calls.
+    - Requests arriving within `window` seconds share one model call
+    - A window of 0 embeds each request synchronously on the caller
+    """
+    
+    def __init__(self, embed_fn, window: float = 0.01, max_batch: int = 32):
+        """
+        Args:
+            embed_fn: Callable mapping a list of texts to an (n, dim) array
+            window: Seconds to wait for more requests after the first
+            max_batch: Maximum texts per model call
+        """
+        self._embed_fn = embed_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+    
+    def embed(self, text: str) -> np.ndarray:
+        """Embed one text, possibly batched with concurrent callers"""
+        if self.window <= 0 or self.max_batch <= 1:
+            return self._embed_fn([text])[0]
+        
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future.result()
+    
+    def _ensure_worker(self):
+        """Start the batching thread on first use"""
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name='query-embedding-batcher', daemon=True
+                )
+                self._worker.start()
+    
+    def _run(self):
+        """Drain the queue in batches of up to max_batch within the window"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                embeddings = self._embed_fn([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+
 class RAGService:
     """
     Main RAG orchestration service.
@@ -26,6 +169,19 @@ class RAGService:
     2. Query → Embedding → Search → Context Assembly → LLM (retrieval)
     """
     
+    # Kept byte-identical across requests so the LLM server can reuse the
+    # cached KV state of this prompt prefix
+    SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions based ONLY on the provided source documents.
+
+CRITICAL RULES:
+1. Answer based ONLY on the context provided below. NEVER use external knowledge or assumptions.
+2. If the information is not explicitly stated in the sources, say "I cannot find this information in the provided documents."
+3. NEVER mention document types (like PowerPoint, PPT, slides) unless explicitly shown in the source text.
+4. When citing information, use the exact source reference format [Source X].
+5. Keep answers factual, accurate, and based strictly on what the sources say.
+6. If you're uncertain about something, acknowledge the uncertainty rather than guessing.
+7. Do not embellish, paraphrase excessively, or add information not found in the sources."""
+    
     def __init__(self):
         """Initialize with lazy-loaded components"""
         self._embedding_service = None
@@ -34,6 +190,27 @@ class RAGService:
         self._query_processor = None
         self._context_assembler = None
         self._llm_service = None
+        
+        from django.conf import settings
+        config = getattr(settings, 'APP_CONFIG', {}).get('retrieval', {})
+        # Query embeddings keyed by hash of (model, cleaned query)
+        self._query_embedding_cache = TTLCache(
+            maxsize=config.get('query_cache_size', 512),
+            ttl=config.get('query_cache_ttl', 1800)
+        )
+        # Storage precision for cached query embeddings: float16, int8 or float32
+        self._query_cache_dtype = config.get('query_cache_dtype', 'float16')
+        
+        # Concurrent query embeddings share one model call
+        self._query_batcher = EmbeddingBatcher(
+            lambda texts: self.embedding_service.embed_queries(texts),
+            window=config.get('embed_batch_window_ms', 10) / 1000,
+            max_batch=config.get('embed_batch_size', 32)
+        )
+        
+        # Background vector store persistence
+        self._save_lock = threading.Lock()
+        self._save_pending = False
     
     @property
     def embedding_service(self):
@@ -93,6 +270,7 @@ class RAGService:
         """
         from .vector_store import ChunkMetadata
         from documents.models import DocumentChunk
+        from django.db import transaction
         
         if not document.extracted_text:
             return {'error': 'No extracted text', 'chunks': 0}
@@ -109,10 +287,7 @@ class RAGService:
         
         # Step 2: Generate embeddings
         chunk_texts = [c['text'] for c in chunks]
-        embeddings = self.embedding_service.embed_texts(
-            chunk_texts,
-            show_progress=len(chunks) > 10
-        )
+        embeddings = self.embedding_service.embed_texts(chunk_texts)
         
         # Step 3: Prepare metadata
         metadatas = [
@@ -128,33 +303,39 @@ class RAGService:
             for c in chunks
         ]
         
-        # Step 4: Store in vector store
+        # Step 4: Store in vector store (which logs the append)
         chunk_ids = self.vector_store.add(
             embeddings=embeddings,
             texts=chunk_texts,
             metadatas=metadatas
         )
         
-        # Step 5: Save chunks to database
-        DocumentChunk.objects.filter(document=document).delete()  # Clear old chunks
-        
-        for i, c in enumerate(chunks):
-            DocumentChunk.objects.create(
-                document=document,
-                chunk_text=c['text'],
-                chunk_index=c['chunk_index'],
-                page_number=c.get('page_number'),
-                start_char=c.get('start_char', 0),
-                end_char=c.get('end_char', 0),
-                embedding_id=str(chunk_ids[i]) if i < len(chunk_ids) else ''
+        # Step 5: Save chunks to database (replace old chunks atomically)
+        with transaction.atomic():
+            DocumentChunk.objects.filter(document=document).delete()
+            DocumentChunk.objects.bulk_create(
+                [
+                    DocumentChunk(
+                        document=document,
+                        chunk_text=c['text'],
+                        chunk_index=c['chunk_index'],
+                        page_number=c.get('page_number'),
+                        start_char=c.get('start_char', 0),
+                        end_char=c.get('end_char', 0),
+                        embedding_id=str(chunk_ids[i]) if i < len(chunk_ids) else ''
+                    )
+                    for i, c in enumerate(chunks)
+                ],
+                batch_size=500
             )
         
         # Step 6: Update document status
         document.embedded = True
         document.save()
         
-        # Step 7: Persist vector store
-        self.vector_store.save()
+        # Step 7: Compact the log into a full save (in the background)
+        if self.vector_store.wal_needs_compaction:
+            self.schedule_save()
         
         return {
             'chunks': len(chunks),
@@ -170,6 +351,28 @@ class RAGService:
             doc_id: Document ID to remove
         """
         self.vector_store.delete_by_doc_id(doc_id)
+        if self.vector_store.wal_needs_compaction:
+            self.schedule_save()
+    
+    def schedule_save(self):
+        """
+        Persist the vector store on a background thread.
+        
+        Saves requested while one is already queued are coalesced into it.
+        
+        Returns:
+            Future for the queued save, or None if one was already pending
+        """
+        with self._save_lock:
+            if self._save_pending:
+                return None
+            self._save_pending = True
+        return _SAVE_EXECUTOR.submit(self._run_save)
+    
+    def _run_save(self):
+        """Background save; changes made after this point queue another save"""
+        with self._save_lock:
+            self._save_pending = False
         self.vector_store.save()
     
     # ============== Retrieval Pipeline ==============
@@ -191,50 +394,127 @@ class RAGService:
         Returns:
             List of chunk dictionaries with scores
         """
-        # Process query
-        processed = self.query_processor.process(query, embed=True)
+        # Process query, reusing a cached embedding for repeated questions
+        processed, query_embedding = self._process_query(query)
         
         # Use suggested K if not specified
         search_k = k or processed.suggested_k
         
-        # Search vector store
-        results = self.vector_store.search(
-            query_embedding=processed.query_embedding,
+        # Search vector store, batched with concurrent requests
+        hits = self.vector_store.search_async(
+            query_embedding=query_embedding,
             k=search_k,
             doc_ids=doc_ids
-        )
+        ).result()
         
-        # Enrich with document info
-        enriched = []
+        # Enrich with document info (one query for all result documents)
         from documents.models import Document
         
-        for result in results:
-            try:
-                doc = Document.objects.get(id=result.doc_id)
-                doc_title = doc.title
-            except Document.DoesNotExist:
-                doc_title = f"Document {result.doc_id}"
+        hit_doc_ids = hits.doc_ids.tolist()
+        docs = Document.objects.only('id', 'title').in_bulk(
+            set(hit_doc_ids)
+        ) if hit_doc_ids else {}
+        
+        enriched = []
+        for chunk_id, doc_id, score, text, metadata in zip(
+            hits.chunk_ids.tolist(), hit_doc_ids, hits.scores.tolist(),
+            hits.texts, hits.metadatas
+        ):
+            doc = docs.get(doc_id)
             
             enriched.append({
-                'chunk_id': result.chunk_id,
-                'doc_id': result.doc_id,
-                'doc_title': doc_title,
-                'text': result.text,
-                'score': result.score,
-                'page_number': result.metadata.page_number,
-                'chunk_index': result.metadata.chunk_index,
-                'chunk_type': result.metadata.chunk_type,
-                'section_title': result.metadata.section_title,
+                'chunk_id': chunk_id,
+                'doc_id': doc_id,
+                'doc_title': doc.title if doc is not None else f"Document {doc_id}",
+                'text': text,
+                'score': score,
+                'page_number': metadata.page_number,
+                'chunk_index': metadata.chunk_index,
+                'chunk_type': metadata.chunk_type,
+                'section_title': metadata.section_title,
             })
         
         return enriched
     
+    def retrieve_or_reuse(
+        self,
+        query: str,
+        conversation_id: int,
+        doc_ids: Optional[List[int]] = None,
+        k: Optional[int] = None
+    ) -> List[dict]:
+        """
+        Retrieve chunks, reusing the session's previous chunks for follow-ups.
+        
+        Follow-ups that stay on topic skip embedding and vector search
+        entirely; other follow-ups merge new results with previous chunks.
+        
+        Args:
+            query: User query
+            conversation_id: Conversation ID for session lookup
+            doc_ids: Optional list of document IDs to search
+            k: Number of results (auto-determined if not specified)
+            
+        Returns:
+            List of chunk dictionaries with scores
+        """
+        from .session_memory import session_memory
+        
+        if not session_memory.is_follow_up_query(conversation_id, query):
+            return self.retrieve(query, doc_ids=doc_ids, k=k)
+        
+        if session_memory.can_reuse_chunks(conversation_id, query, doc_ids):
+            return list(session_memory.get_previous_chunks(conversation_id))
+        
+        chunks = self.retrieve(query, doc_ids=doc_ids, k=k)
+        return session_memory.get_context_for_follow_up(conversation_id, chunks)
+    
+    def _query_cache_key(self, cleaned_query: str) -> str:
+        """Cache key for a cleaned query under the current embedding model"""
+        model_name = self.embedding_service._model_name or ''
+        return hashlib.sha1(f"{model_name}|{cleaned_query}".encode('utf-8')).hexdigest()
+    
+    def _process_query(self, query: str):
+        """
+        Process a query, serving its embedding from the TTL cache when possible.
+        
+        Returns:
+            Tuple of (ProcessedQuery, query embedding)
+        """
+        cleaned = self.query_processor.clean_query(query)
+        key = self._query_cache_key(cleaned)
+        
+        processed = self.query_processor.process(query, embed=False)
+        
+        cached = self._query_embedding_cache.get(key)
+        if cached is not None:
+            return processed, _dequantize_embedding(cached)
+        
+        embedding = np.asarray(self._query_batcher.embed(cleaned), dtype=np.float32)
+        processed = replace(processed, query_embedding=embedding)
+        # Key again: the model may only have been loaded by this call
+        entry = _quantize_embedding(embedding, self._query_cache_dtype)
+        # Cached values are shared, so they must not be mutated
+        entry[0].flags.writeable = False
+        self._query_embedding_cache.set(self._query_cache_key(cleaned), entry)
+        
+        return processed, embedding
+    
+    def _cached_query_embedding(self, query: str) -> Optional[np.ndarray]:
+        """Embedding cached by an earlier _process_query(), without computing one"""
+        cached = self._query_embedding_cache.get(
+            self._query_cache_key(self.query_processor.clean_query(query))
+        )
+        return _dequantize_embedding(cached) if cached is not None else None
+    
     def query(
         self,
         question: str,
         doc_ids: Optional[List[int]] = None,
         k: Optional[int] = None,
-        stream: bool = False
+        stream: bool = False,
+        conversation_id: Optional[int] = None,
+        chunks: Optional[List[dict]] = None
     ) -> RAGResponse:
         """
         Full RAG query: retrieve context and generate answer.
@@ -244,12 +524,18 @@ class RAGService:
             doc_ids: Optional document filter
             k: Number of chunks to retrieve
             stream: Whether to stream response
+            conversation_id: Optional conversation for follow-up chunk reuse
+            chunks: Chunks the caller already retrieved; skips retrieval so
+                the answer is built from the same chunks it cites
             
         Returns:
             RAGResponse with answer and sources
         """
-        # Step 1: Retrieve relevant chunks
-        chunks = self.retrieve(question, doc_ids=doc_ids, k=k)
+        # Step 1: Retrieve relevant chunks (unless the caller already did)
+        if chunks is None and conversation_id is not None:
+            chunks = self.retrieve_or_reuse(question, conversation_id, doc_ids=doc_ids, k=k)
+        elif chunks is None:
+            chunks = self.retrieve(question, doc_ids=doc_ids, k=k)
         
         if not chunks:
             return RAGResponse(
@@ -264,17 +550,6 @@ class RAGService:
         assembled = self.context_assembler.assemble(chunks)
         
         # Step 3: Generate answer
-        system_prompt = """You are a helpful AI assistant that answers questions based ONLY on the provided source documents.
-
-CRITICAL RULES:
-1. Answer based ONLY on the context provided below. NEVER use external knowledge or assumptions.
-2. If the information is not explicitly stated in the sources, say "I cannot find this information in the provided documents."
-3. NEVER mention document types (like PowerPoint, PPT, slides) unless explicitly shown in the source text.
-4. When citing information, use the exact source reference format [Source X].
-5. Keep answers factual, accurate, and based strictly on what the sources say.
-6. If you're uncertain about something, acknowledge the uncertainty rather than guessing.
-7. Do not embellish, paraphrase excessively, or add information not found in the sources."""
-
         user_prompt = f"""Context from documents:
 
 {assembled.context_text}
@@ -285,12 +560,27 @@ Question: {question}
 
 Please provide a comprehensive answer based on the sources above."""
 
-        if stream:
+        # Similar questions over the same context reuse a cached answer. The
+        # lookup needs the question embedding, so it only runs when retrieval
+        # already computed one; reused chunks skip embedding altogether
+        question_embedding = self._cached_query_embedding(question)
+        if question_embedding is None:
             answer = self.llm_service.generate(
+                user_prompt,
+                system_prompt=self.SYSTEM_PROMPT,
+                stream=stream
+            )
+        else:
+            answer = self.llm_service.generate_cached(
+                question,
+                [assembled.context_text],
                 prompt=user_prompt,
-                system_prompt=system_prompt,
-                stream=True
+                system_prompt=self.SYSTEM_PROMPT,
+                stream=stream,
+                question_embedding=question_embedding
             )
+        
+        if stream:
             # For streaming, return generator wrapped in response
             return RAGResponse(
                 answer=answer,  # This is a generator
@@ -300,12 +590,6 @@ Please provide a comprehensive answer based on the sources above."""
                 model_used=self.llm_service.model
             )
         else:
-            answer = self.llm_service.generate(
-                prompt=user_prompt,
-                system_prompt=system_prompt,
-                stream=False
-            )
-            
             return RAGResponse(
                 answer=answer,
                 sources=[{'doc_id': d} for d in assembled.source_documents],
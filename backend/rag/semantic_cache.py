@@ -0,0 +1,125 @@
+"""
+Semantic Answer Cache for RAG Pipeline
+Reuses LLM answers for repeated or paraphrased questions asked against the
+same context, skipping a full generation round-trip.
+"""
+import hashlib
+import threading
+import time
+import numpy as np
+from typing import Generator, Iterable, Optional
+from django.conf import settings
+
+
+def context_key(parts: Iterable[str]) -> int:
+    """Stable 64-bit fingerprint of the context an answer was generated from"""
+    digest = hashlib.sha1("\x1e".join(parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'little', signed=True)
+
+
+class SemanticAnswerCache:
+    """
+    Bounded in-memory cache of (question embedding, context) -> answer.
+    - A hit needs the exact same context and cosine similarity >= threshold
+    - Least recently used entries are evicted once max_entries is reached
+    - Embeddings are kept in one matrix, so a lookup is a single mat-vec
+    """
+    
+    def __init__(self, max_entries: int = 512, threshold: float = 0.92):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_entries: Maximum number of cached answers
+            threshold: Minimum cosine similarity between questions for a hit
+        """
+        config = getattr(settings, 'APP_CONFIG', {}).get('llm', {})
+        self.enabled = config.get('answer_cache_enabled', True)
+        self.max_entries = config.get('answer_cache_size', max_entries)
+        self.threshold = config.get('answer_cache_threshold', threshold)
+        
+        self._lock = threading.Lock()
+        self._embeddings: Optional[np.ndarray] = None
+        self._context_keys = np.zeros(self.max_entries, dtype=np.int64)
+        self._last_used = np.zeros(self.max_entries, dtype=np.float64)
+        self._answers: list = [None] * self.max_entries
+        self._size = 0
+    
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+    
+    def get(self, embedding: np.ndarray, context: int) -> Optional[str]:
+        """
+        Look up an answer for a question embedding under a context key.
+        
+        Returns:
+            Cached answer, or None on a miss
+        """
+        if not self.enabled or self._size == 0:
+            return None
+        
+        query = self._normalize(embedding)
+        with self._lock:
+            if self._embeddings is None or query.shape[0] != self._embeddings.shape[1]:
+                return None
+            
+            size = self._size
+            sims = self._embeddings[:size] @ query
+            sims[self._context_keys[:size] != context] = -np.inf
+            
+            slot = int(np.argmax(sims))
+            if sims[slot] < self.threshold:
+                return None
+            
+            self._last_used[slot] = time.monotonic()
+            return self._answers[slot]
+    
+    def put(self, embedding: np.ndarray, context: int, answer: str):
+        """Store an answer, evicting the least recently used entry if full"""
+        if not self.enabled or not answer:
+            return
+        
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._embeddings is None or vector.shape[0] != self._embeddings.shape[1]:
+                # First entry (or embedding model changed): size the matrix
+                self._embeddings = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._size = 0
+            
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+            
+            self._embeddings[slot] = vector
+            self._context_keys[slot] = context
+            self._last_used[slot] = time.monotonic()
+            self._answers[slot] = answer
+    
+    def wrap_stream(
+        self,
+        stream: Generator[str, None, None],
+        embedding: np.ndarray,
+        context: int
+    ) -> Generator[str, None, None]:
+        """Pass a streamed answer through, caching it once fully received"""
+        parts = []
+        for chunk in stream:
+            parts.append(chunk)
+            yield chunk
+        self.put(embedding, context, "".join(parts))
+    
+    def clear(self):
+        """Remove all cached answers"""
+        with self._lock:
+            self._embeddings = None
+            self._answers = [None] * self.max_entries
+            self._size = 0
+
+
+# Global instance
+semantic_cache = SemanticAnswerCache()
@@ -4,10 +4,53 @@ Maintains conversation context for follow-up questions.
 """
 from typing import List, Dict, Optional, Any
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
+import re
 import time
 
 
+# Phrases that mark a query as a follow-up
+FOLLOW_UP_PHRASES = (
+    'explain more', 'tell me more', 'elaborate',
+    'what about', 'how about', 'and what',
+    'can you clarify', 'what do you mean',
+    'in other words', 'simpler', 'more detail',
+    'why is that', 'how does that', 'what else',
+    'related to that', 'regarding that', 'on that note',
+    'also', 'additionally', "what's that",
+)
+_FOLLOW_UP_RE = re.compile('|'.join(map(re.escape, FOLLOW_UP_PHRASES)))
+
+# Match all phrases in one pass with an Aho-Corasick automaton when
+# pyahocorasick is installed; otherwise use the compiled alternation
+try:
+    import ahocorasick
+    
+    _FOLLOW_UP_AUTOMATON = ahocorasick.Automaton()
+    for _phrase in FOLLOW_UP_PHRASES:
+        _FOLLOW_UP_AUTOMATON.add_word(_phrase, _phrase)
+    _FOLLOW_UP_AUTOMATON.make_automaton()
+    del _phrase
+except ImportError:
+    _FOLLOW_UP_AUTOMATON = None
+
+
+def _contains_follow_up_phrase(text: str) -> bool:
+    """Check whether text contains any follow-up phrase"""
+    if _FOLLOW_UP_AUTOMATON is not None:
+        return next(_FOLLOW_UP_AUTOMATON.iter(text), None) is not None
+    return _FOLLOW_UP_RE.search(text) is not None
+
+
+# Queries opening with a pronoun that has no clear referent
+PRONOUN_PATTERNS = (
+    r'^(it|this|that|these|those|they)\s',
+    r'^what (is|are) (it|they|these|those)\b',
+    r'^(explain|describe|summarize) (it|this|that)\b',
+)
+_PRONOUN_RE = re.compile('|'.join(PRONOUN_PATTERNS))
+
+
 @dataclass
 class SessionContext:
     """Context for a single conversation session"""
@@ -15,8 +58,27 @@ class SessionContext:
     last_query: str = ""
     last_chunks: List[dict] = field(default_factory=list)
     query_history: List[str] = field(default_factory=list)
-    topic_keywords: List[str] = field(default_factory=list)
+    # Most recent lowercased topic keywords, oldest first
+    topic_keywords: deque = field(default_factory=lambda: deque(maxlen=30))
     last_updated: float = field(default_factory=time.time)
+    # Membership set mirroring topic_keywords, kept in sync on update
+    _topic_set: set = field(default_factory=set, init=False, repr=False)
+    
+    def __post_init__(self):
+        keywords = self.topic_keywords
+        self.topic_keywords = deque(maxlen=30)
+        self._add_keywords(keywords)
+    
+    def _add_keywords(self, keywords: List[str]):
+        """Append unseen keywords, dropping the oldest past the limit"""
+        for kw in keywords:
+            kw = kw.lower()
+            if kw in self._topic_set:
+                continue
+            if len(self.topic_keywords) == self.topic_keywords.maxlen:
+                self._topic_set.discard(self.topic_keywords[0])
+            self.topic_keywords.append(kw)
+            self._topic_set.add(kw)
     
     def update(self, query: str, chunks: List[dict], keywords: List[str]):
         """Update session with new query context"""
@@ -25,7 +87,7 @@ class SessionContext:
         self.query_history.append(query)
         
         # Merge keywords, keeping most recent
-        self.topic_keywords = list(set(self.topic_keywords[-20:] + keywords))[-30:]
+        self._add_keywords(keywords)
         self.last_updated = time.time()
     
     def is_follow_up(self, query: str) -> bool:
@@ -41,41 +103,24 @@ class SessionContext:
         query_lower = query.lower()
         
         # Check for follow-up indicators
-        follow_up_patterns = [
-            'explain more', 'tell me more', 'elaborate',
-            'what about', 'how about', 'and what',
-            'can you clarify', 'what do you mean',
-            'in other words', 'simpler', 'more detail',
-            'why is that', 'how does that', 'what else',
-            'related to that', 'regarding that', 'on that note',
-            'also', 'additionally', "what's that",
-        ]
-        
-        for pattern in follow_up_patterns:
-            if pattern in query_lower:
-                return True
+        if _contains_follow_up_phrase(query_lower):
+            return True
         
         # Check for pronouns without clear referent
-        pronoun_patterns = [
-            r'^(it|this|that|these|those|they)\s',
-            r'^what (is|are) (it|they|these|those)\b',
-            r'^(explain|describe|summarize) (it|this|that)\b',
-        ]
-        
-        import re
-        for pattern in pronoun_patterns:
-            if re.search(pattern, query_lower):
-                return True
+        if _PRONOUN_RE.match(query_lower):
+            return True
         
         # Check keyword overlap with topic
-        if self.topic_keywords:
-            query_words = set(query_lower.split())
-            topic_words = set(w.lower() for w in self.topic_keywords)
-            overlap = len(query_words & topic_words)
-            if overlap >= 2:
-                return True
+        if self.keyword_overlap(query_lower) >= 2:
+            return True
         
         return False
+    
+    def keyword_overlap(self, query: str) -> int:
+        """Count query words that are session topic keywords"""
+        if not self._topic_set:
+            return 0
+        return len(self._topic_set.intersection(query.lower().split()))
 
 
 class SessionMemory:
@@ -87,9 +132,18 @@ class SessionMemory:
     # Session timeout in seconds (30 minutes)
     SESSION_TIMEOUT = 1800
     
+    # Upper bound on live sessions; least recently used are evicted first
+    MAX_SESSIONS = 10000
+    
+    # Follow-ups reuse previous chunks without a new search when they share
+    # this many topic keywords, or arrive within this many seconds
+    REUSE_MIN_OVERLAP = 3
+    REUSE_WINDOW = 60
+    
     def __init__(self):
         """Initialize session storage"""
-        self._sessions: Dict[int, SessionContext] = {}
+        # Ordered from least to most recently used
+        self._sessions: OrderedDict[int, SessionContext] = OrderedDict()
     
     def get_session(self, conversation_id: int) -> SessionContext:
         """
@@ -104,12 +158,18 @@ class SessionMemory:
         # Clean expired sessions periodically
         self._cleanup_expired()
         
-        if conversation_id not in self._sessions:
-            self._sessions[conversation_id] = SessionContext(
-                conversation_id=conversation_id
-            )
+        session = self._sessions.get(conversation_id)
+        if session is None or time.time() - session.last_updated > self.SESSION_TIMEOUT:
+            session = SessionContext(conversation_id=conversation_id)
+            self._sessions[conversation_id] = session
+        
+        self._sessions.move_to_end(conversation_id)
+        
+        # Bound memory by evicting the least recently used sessions
+        while len(self._sessions) > self.MAX_SESSIONS:
+            self._sessions.popitem(last=False)
         
-        return self._sessions[conversation_id]
+        return session
     
     def update_session(
         self,
@@ -162,6 +222,36 @@ class SessionMemory:
         
         return session.is_follow_up(query)
     
+    def can_reuse_chunks(
+        self,
+        conversation_id: int,
+        query: str,
+        doc_ids: Optional[List[int]] = None
+    ) -> bool:
+        """
+        Check if a follow-up can be answered from the previous chunks alone.
+        
+        Args:
+            conversation_id: Conversation ID
+            query: New query
+            doc_ids: Documents the query is restricted to
+            
+        Returns:
+            True if previous chunks can stand in for a new retrieval
+        """
+        session = self._sessions.get(conversation_id)
+        if not session or not session.last_chunks:
+            return False
+        
+        # Never reuse chunks from documents outside the current selection
+        if doc_ids and any(c.get('doc_id') not in doc_ids for c in session.last_chunks):
+            return False
+        
+        if time.time() - session.last_updated < self.REUSE_WINDOW:
+            return True
+        
+        return session.keyword_overlap(query) >= self.REUSE_MIN_OVERLAP
+    
     def get_context_for_follow_up(
         self,
         conversation_id: int,
@@ -207,15 +297,18 @@ class SessionMemory:
             del self._sessions[conversation_id]
     
     def _cleanup_expired(self):
-        """Remove expired sessions"""
-        now = time.time()
-        expired = [
-            cid for cid, session in self._sessions.items()
-            if now - session.last_updated > self.SESSION_TIMEOUT
-        ]
+        """
+        Remove expired sessions from the least recently used end.
         
-        for cid in expired:
-            del self._sessions[cid]
+        Stops at the first live session, so the cost is proportional to the
+        number of sessions evicted rather than the number stored.
+        """
+        now = time.time()
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_updated <= self.SESSION_TIMEOUT:
+                break
+            self._sessions.popitem(last=False)
 
 
 # Global instance
@@ -58,6 +58,24 @@ Conclusion text."""
         # Table should be complete
         self.assertIn('Column A', table_chunks[0].text)
         self.assertIn('Value 4', table_chunks[0].text)
+    
+    def test_plain_text_chunking(self):
+        """Test that plain prose is packed into paragraph-aligned chunks"""
+        from rag.chunking_service import SemanticChunker
+        
+        chunker = SemanticChunker(min_tokens=10, max_tokens=50)
+        
+        paragraphs = [f"Paragraph {i} " + "word " * 30 for i in range(6)]
+        text = "\n\n".join(paragraphs)
+        
+        chunks = chunker.chunk_text(text)
+        
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([c.chunk_index for c in chunks], list(range(len(chunks))))
+        for chunk in chunks:
+            self.assertEqual(chunk.chunk_type, 'text')
+            self.assertIsNone(chunk.section_title)
+            self.assertEqual(text[chunk.start_char:chunk.start_char + 11], chunk.text[:11])
 
 
 class EmbeddingServiceTest(TestCase):
@@ -97,6 +115,37 @@ class EmbeddingServiceTest(TestCase):
         self.assertEqual(embeddings.shape[0], 3)
 
 
+class EmbeddingCacheTest(TestCase):
+    """Test persistent embedding cache"""
+    
+    def test_roundtrip_and_short_texts(self):
+        """Test that cached embeddings are returned and short texts skipped"""
+        import os
+        import tempfile
+        from rag.embedding_cache import EmbeddingCache
+        
+        cache = EmbeddingCache(path=os.path.join(tempfile.mkdtemp(), 'cache.sqlite3'))
+        texts = ["A sufficiently long chunk of document text to cache", "short"]
+        
+        keys = cache.make_keys('model-a', texts)
+        self.assertIsNone(keys[1])
+        
+        embeddings = np.random.rand(2, 8).astype(np.float32)
+        cache.set_many(keys, embeddings)
+        
+        found = cache.get_many(keys)
+        self.assertEqual(len(found), 1)
+        np.testing.assert_array_equal(found[keys[0]], embeddings[0])
+        
+        # Same text under another model is a miss
+        self.assertEqual(cache.get_many(cache.make_keys('model-b', texts)), {})
+
+
+def _fake_embed(texts):
+    """Deterministic per-text embeddings, picklable for worker processes"""
+    return np.array([[len(t), t.count('a'), 1.0, 0.5] for t in texts], dtype=np.float32)
+
+
 class VectorStoreTest(TestCase):
     """Test FAISS vector store"""
     
@@ -151,6 +200,366 @@ class VectorStoreTest(TestCase):
         
         self.assertEqual(len(results), 1)
         self.assertEqual(results[0].doc_id, 2)
+    
+    def test_search_async_batches(self):
+        """Test that concurrent searches share a batch and match direct search"""
+        from concurrent.futures import ThreadPoolExecutor
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        store.search_batch_window = 0.05
+        
+        embeddings = np.random.rand(20, 8).astype(np.float32)
+        store.add(
+            embeddings,
+            [f"Chunk {i}" for i in range(20)],
+            [ChunkMetadata(doc_id=i % 4, chunk_id=i + 1, chunk_index=i) for i in range(20)]
+        )
+        
+        requests = [(embeddings[i], 1 + i % 5, [i % 4] if i % 2 else None) for i in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = list(pool.map(lambda r: store.search_async(r[0], k=r[1], doc_ids=r[2]), requests))
+        
+        for (query, k, doc_ids), future in zip(requests, futures):
+            expected = store.search_arrays(query, k=k, doc_ids=doc_ids)
+            self.assertEqual(future.result(timeout=5).chunk_ids.tolist(), expected.chunk_ids.tolist())
+    
+    def test_add_texts_parallel(self):
+        """Test that sharded embedding keeps texts and vectors aligned"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=4)
+        
+        texts = ["a" * i + "b" * (20 - i) for i in range(1, 11)]
+        metadatas = [ChunkMetadata(doc_id=1, chunk_id=i + 1, chunk_index=i) for i in range(10)]
+        ids = store.add_texts(texts, metadatas, _fake_embed, num_workers=3)
+        
+        self.assertEqual(len(ids), 10)
+        results = store.search(_fake_embed([texts[7]])[0], k=1)
+        self.assertEqual(results[0].text, texts[7])
+    
+    def test_add_texts_default_embedder(self):
+        """Test that workers embed with the app's embedding service by default"""
+        import multiprocessing
+        from unittest import mock
+        from rag.embedding_service import embedding_service
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        if multiprocessing.get_start_method() != 'fork':
+            self.skipTest("Workers only inherit the patched service when forked")
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=4)
+        
+        texts = ["a" * i + "b" * (20 - i) for i in range(1, 11)]
+        metadatas = [ChunkMetadata(doc_id=1, chunk_id=i + 1, chunk_index=i) for i in range(10)]
+        with mock.patch.object(embedding_service, '_load_model'), \
+                mock.patch.object(embedding_service, 'embed_texts', _fake_embed):
+            ids = store.add_texts(texts, metadatas, num_workers=2)
+        
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(store.search(_fake_embed([texts[3]])[0], k=1)[0].text, texts[3])
+    
+    def test_doc_filter_finds_distant_chunks(self):
+        """Test that a document filter isn't limited to the global top-k"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        
+        embeddings = np.tile(np.eye(8, dtype=np.float32)[0], (50, 1))
+        embeddings[-1] = np.eye(8, dtype=np.float32)[1]
+        store.add(
+            embeddings,
+            [f"Chunk {i}" for i in range(50)],
+            [ChunkMetadata(doc_id=1 if i < 49 else 2, chunk_id=i + 1, chunk_index=i) for i in range(50)]
+        )
+        
+        results = store.search(embeddings[0], k=3, doc_ids=[2])
+        self.assertEqual([r.text for r in results], ["Chunk 49"])
+        self.assertEqual(store.search(embeddings[0], k=3, doc_ids=[3]), [])
+    
+    def test_row_cache(self):
+        """Test that hit rows are cached and evicted on delete"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        store.row_cache_size = 2
+        
+        embeddings = np.random.rand(3, 8).astype(np.float32)
+        metadatas = [ChunkMetadata(doc_id=i + 1, chunk_id=i + 1, chunk_index=0) for i in range(3)]
+        store.add(embeddings, ["A", "B", "C"], metadatas)
+        
+        store.search(embeddings[0], k=3)
+        self.assertEqual(len(store._row_cache), 2)
+        
+        cached = next(reversed(store._row_cache))
+        store.delete_by_doc_id(int(store._doc_ids_arr[cached]))
+        self.assertNotIn(cached, store._row_cache)
+    
+    def test_scores_are_cosine(self):
+        """Test that unnormalized vectors are scored by cosine similarity"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        
+        embeddings = np.random.rand(2, 8).astype(np.float32) * 10
+        metadatas = [
+            ChunkMetadata(doc_id=1, chunk_id=0, chunk_index=0),
+            ChunkMetadata(doc_id=1, chunk_id=1, chunk_index=1),
+        ]
+        store.add(embeddings, ["First", "Second"], metadatas)
+        
+        results = store.search(embeddings[0] * 3, k=1)
+        self.assertEqual(results[0].text, "First")
+        self.assertAlmostEqual(results[0].score, 1.0, places=5)
+        
+        # The float32 input buffer was normalized in place, not copied
+        np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, rtol=1e-5)
+    
+    def test_ivfpq_conversion(self):
+        """Test that large corpora switch to a trained IVF-PQ index"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=16)
+        store.ivfpq_threshold = 500
+        store.ivfpq_factory = 'IVF8,PQ4x4'
+        
+        embeddings = np.random.rand(600, 16).astype(np.float32)
+        store.add(
+            embeddings,
+            [f"Chunk {i}" for i in range(600)],
+            [ChunkMetadata(doc_id=i % 3, chunk_id=i + 1, chunk_index=i) for i in range(600)]
+        )
+        
+        self.assertFalse(store._is_flat())
+        self.assertEqual(len(store.search(embeddings[0], k=5)), 5)
+        
+        hits = store.search(embeddings[0], k=5, doc_ids=[2])
+        self.assertEqual([r.doc_id for r in hits], [2] * 5)
+        
+        store.delete_by_doc_id(0)
+        self.assertFalse(store._is_flat())
+        self.assertEqual(store.get_total_count(), 400)
+    
+    def test_ivfpq_waits_for_training_points(self):
+        """Test that conversion waits until every IVF centroid can be trained"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=16)
+        store.ivfpq_threshold = 100
+        store.ivfpq_factory = 'IVF16,PQ4x4'  # FAISS wants 39 * 16 = 624 points
+        
+        embeddings = np.random.rand(700, 16).astype(np.float32)
+        texts = [f"Chunk {i}" for i in range(700)]
+        metadatas = [ChunkMetadata(doc_id=0, chunk_id=i + 1, chunk_index=i) for i in range(700)]
+        
+        store.add(embeddings[:600], texts[:600], metadatas[:600])
+        self.assertTrue(store._is_flat())
+        
+        store.add(embeddings[600:], texts[600:], metadatas[600:])
+        self.assertFalse(store._is_flat())
+        self.assertEqual(store._index.ntotal, 700)
+    
+    def test_fastscan_delete(self):
+        """Test that FastScan deletes are masked, then compacted away"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=16)
+        store.ivfpq_threshold = 500
+        store.ivfpq_factory = 'IVF8,PQ4x4fs'
+        
+        embeddings = np.random.rand(600, 16).astype(np.float32)
+        # Doc 0 clusters around one direction, so its tombstones fill the
+        # top candidates for a query near it
+        embeddings[::10] = embeddings[0] + 0.01 * np.random.rand(60, 16)
+        store.add(
+            embeddings.copy(),
+            [f"Chunk {i}" for i in range(600)],
+            [ChunkMetadata(doc_id=i % 10, chunk_id=i + 1, chunk_index=i) for i in range(600)]
+        )
+        self.assertFalse(store._supports_remove())
+        
+        # Below the compaction ratio the vectors stay, masked from results
+        store.delete_by_doc_id(0)
+        self.assertEqual(store._index.ntotal, 600)
+        self.assertEqual(store.get_total_count(), 540)
+        for hit_docs in (
+            [r.doc_id for r in store.search(embeddings[0], k=20)],
+            store.search_async(embeddings[0], k=20).result(timeout=10).doc_ids.tolist(),
+        ):
+            self.assertEqual(len(hit_docs), 20)
+            self.assertNotIn(0, hit_docs)
+        
+        store.delete_by_doc_id(1)
+        store.delete_by_doc_id(2)
+        self.assertEqual(store._index.ntotal, 420)
+        self.assertEqual(store._tombstones, 0)
+        self.assertEqual(len(store.search(embeddings[3], k=5)), 5)
+        
+        # A reloaded FastScan index can still be compacted
+        store.save()
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=16)
+        self.assertFalse(store._supports_remove())
+        for doc_id in (3, 4):
+            store.delete_by_doc_id(doc_id)
+        self.assertEqual(store._index.ntotal, 300)
+        self.assertEqual(store._tombstones, 0)
+        results = store.search(embeddings[5], k=5)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(r.doc_id >= 5 for r in results))
+    
+    def test_hnsw_index(self):
+        """Test HNSW search, filtering, and tombstoned deletes"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=16)
+        store.index_type = 'hnsw'
+        store.ivfpq_threshold = 50
+        
+        embeddings = np.random.rand(100, 16).astype(np.float32)
+        store.add(
+            embeddings.copy(),
+            [f"Chunk {i}" for i in range(100)],
+            [ChunkMetadata(doc_id=i % 10, chunk_id=i + 1, chunk_index=i) for i in range(100)]
+        )
+        
+        # HNSW is never converted to IVF-PQ
+        self.assertTrue(store._is_hnsw())
+        self.assertEqual(store.search(embeddings[5], k=1)[0].text, "Chunk 5")
+        self.assertEqual([r.doc_id for r in store.search(embeddings[0], k=3, doc_ids=[7])], [7] * 3)
+        
+        store.delete_by_doc_id(0)
+        self.assertEqual(store.get_total_count(), 90)
+        self.assertNotIn(0, [r.doc_id for r in store.search(embeddings[0], k=10)])
+        
+        for doc_id in (1, 2):
+            store.delete_by_doc_id(doc_id)
+        self.assertTrue(store._is_hnsw())
+        self.assertEqual(store._index.ntotal, 70)
+        
+        store.save()
+        reopened = FAISSVectorStore(persist_dir=self.temp_dir, dimension=16)
+        self.assertTrue(reopened._is_hnsw())
+        self.assertEqual(reopened.search(embeddings[5], k=1)[0].text, "Chunk 5")
+    
+    def test_wal_replay(self):
+        """Test that logged changes are restored without a full save"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        
+        embeddings = np.random.rand(3, 8).astype(np.float32)
+        texts = ["Doc1 chunk1", "Doc1 chunk2", "Doc2 chunk1"]
+        metadatas = [
+            ChunkMetadata(doc_id=1, chunk_id=1, chunk_index=0),
+            ChunkMetadata(doc_id=1, chunk_id=2, chunk_index=1),
+            ChunkMetadata(doc_id=2, chunk_id=3, chunk_index=0),
+        ]
+        store.add(embeddings, texts, metadatas)
+        store.delete_by_doc_id(1)
+        
+        reopened = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        self.assertEqual(reopened.get_total_count(), 1)
+        self.assertEqual(reopened.wal_records, 2)
+        
+        # A full save folds the log into the snapshot
+        reopened.save()
+        self.assertEqual(reopened.wal_records, 0)
+        self.assertEqual(FAISSVectorStore(persist_dir=self.temp_dir, dimension=8).get_total_count(), 1)
+    
+    def test_wal_replay_is_idempotent(self):
+        """Test that replaying adds already in the snapshot doesn't duplicate them"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        embeddings = np.random.rand(3, 8).astype(np.float32)
+        store.add(
+            embeddings,
+            ["Chunk 0", "Chunk 1", "Chunk 2"],
+            [ChunkMetadata(doc_id=1, chunk_id=i, chunk_index=i) for i in range(3)]
+        )
+        
+        # A save that crashes before dropping the log leaves both behind
+        wal = store._wal_path.read_bytes()
+        store.save()
+        store._wal_path.write_bytes(wal)
+        
+        reopened = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        self.assertEqual(reopened._index.ntotal, 3)
+        self.assertEqual(reopened.get_total_count(), 3)
+        self.assertEqual([r.text for r in reopened.search(embeddings[1], k=2)][:1], ["Chunk 1"])
+        self.assertEqual(len({r.chunk_id for r in reopened.search(embeddings[1], k=3)}), 3)
+    
+    def test_doc_ids_snapshot(self):
+        """Test that a saved doc ID lookup is loaded and can be saved over"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        
+        embeddings = np.random.rand(3, 8).astype(np.float32)
+        metadatas = [
+            ChunkMetadata(doc_id=1, chunk_id=1, chunk_index=0),
+            ChunkMetadata(doc_id=2, chunk_id=2, chunk_index=0),
+            ChunkMetadata(doc_id=3, chunk_id=3, chunk_index=0),
+        ]
+        store.add(embeddings, ["A", "B", "C"], metadatas)
+        store.save()
+        
+        reopened = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        self.assertNotIsInstance(reopened._doc_ids_arr, np.memmap)
+        self.assertEqual(reopened.search(embeddings[1], k=3, doc_ids=[2])[0].text, "B")
+        
+        # Deletes change the loaded lookup, not the snapshot, until the next save
+        reopened.delete_by_doc_id(2)
+        self.assertEqual(reopened.search(embeddings[1], k=3, doc_ids=[2]), [])
+        self.assertEqual(np.fromfile(reopened._doc_ids_path, dtype=np.int64)[2], 2)
+        
+        reopened.save()
+        self.assertEqual(np.fromfile(reopened._doc_ids_path, dtype=np.int64)[2], -1)
+        self.assertFalse(reopened._wal_path.exists())
+    
+    def test_doc_chunk_map(self):
+        """Test that per-document chunk IDs track adds, deletes and reloads"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        embeddings = np.random.rand(4, 8).astype(np.float32)
+        store.add(embeddings, ["A", "B", "C", "D"], [
+            ChunkMetadata(doc_id=doc_id, chunk_id=i + 1, chunk_index=i)
+            for i, doc_id in enumerate([1, 2, 1, 3])
+        ])
+        self.assertEqual(store._doc_chunks[1].tolist(), [1, 3])
+        
+        store.delete_by_doc_id(1)
+        self.assertNotIn(1, store._doc_chunks)
+        self.assertIsNone(store._doc_selector([1]))
+        store.save()
+        
+        reopened = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        self.assertEqual({d: c.tolist() for d, c in reopened._doc_chunks.items()}, {2: [2], 3: [4]})
+        self.assertEqual(reopened.search(embeddings[3], k=2, doc_ids=[3])[0].text, "D")
+    
+    def test_search_arrays(self):
+        """Test that array results match object results"""
+        from rag.vector_store import FAISSVectorStore, ChunkMetadata
+        
+        store = FAISSVectorStore(persist_dir=self.temp_dir, dimension=8)
+        
+        embeddings = np.random.rand(4, 8).astype(np.float32)
+        texts = ["A", "B", "C", "D"]
+        metadatas = [
+            ChunkMetadata(doc_id=i % 2, chunk_id=i, chunk_index=i)
+            for i in range(4)
+        ]
+        store.add(embeddings, texts, metadatas)
+        
+        query = np.random.rand(8).astype(np.float32)
+        results = store.search(query, k=3)
+        hits = store.search_arrays(query, k=3)
+        
+        self.assertEqual(len(hits), 3)
+        self.assertEqual(hits.chunk_ids.tolist(), [r.chunk_id for r in results])
+        self.assertEqual(hits.texts, [r.text for r in results])
+        np.testing.assert_allclose(hits.scores, [r.score for r in results])
 
 
 class QueryProcessorTest(TestCase):
@@ -183,6 +592,125 @@ class QueryProcessorTest(TestCase):
         cleaned = processor.clean_query("  Hey, can you tell me about AI?  ")
         self.assertNotIn("Hey,", cleaned)
         self.assertNotIn("  ", cleaned)
+    
+    def test_process_cache(self):
+        """Test that repeated queries are served from the LRU cache"""
+        from rag.query_processor import QueryProcessor
+        
+        processor = QueryProcessor(cache_size=2)
+        
+        first = processor.process("What is machine learning?", embed=False)
+        second = processor.process("Hey, What is machine learning?", embed=False)
+        
+        self.assertEqual(second.original_query, "Hey, What is machine learning?")
+        self.assertIs(second.keywords, first.keywords)
+        
+        processor.process("Compare CNN and ViT", embed=False)
+        processor.process("List all models", embed=False)
+        self.assertEqual(len(processor._cache), 2)
+
+
+class EmbeddingBatcherTest(TestCase):
+    """Test query embedding micro-batching"""
+    
+    def test_concurrent_queries_share_batch(self):
+        """Test that concurrent requests are embedded together in order"""
+        from concurrent.futures import ThreadPoolExecutor
+        from rag.rag_service import EmbeddingBatcher
+        
+        calls = []
+        
+        def embed_fn(texts):
+            calls.append(len(texts))
+            return np.array([[float(t)] for t in texts], dtype=np.float32)
+        
+        batcher = EmbeddingBatcher(embed_fn, window=0.2, max_batch=8)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(batcher.embed, ['1', '2', '3', '4']))
+        
+        self.assertEqual([r[0] for r in results], [1.0, 2.0, 3.0, 4.0])
+        self.assertLess(len(calls), 4)
+
+
+class SemanticAnswerCacheTest(TestCase):
+    """Test semantic answer cache"""
+    
+    def test_similar_question_same_context(self):
+        """Test that hits need a similar question and an identical context"""
+        from rag.semantic_cache import SemanticAnswerCache, context_key
+        
+        cache = SemanticAnswerCache(max_entries=2, threshold=0.9)
+        question = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+        context = context_key(["chunk one", "chunk two"])
+        
+        cache.put(question, context, "Answer")
+        
+        self.assertEqual(cache.get(np.array([0.99, 0.05, 0.0]), context), "Answer")
+        self.assertIsNone(cache.get(np.array([0.0, 1.0, 0.0]), context))
+        self.assertIsNone(cache.get(question, context_key(["chunk one"])))
+
+
+class SessionMemoryTest(TestCase):
+    """Test conversation session memory"""
+    
+    def test_chunk_reuse(self):
+        """Test that recent on-topic follow-ups reuse previous chunks"""
+        from rag.session_memory import SessionMemory
+        
+        memory = SessionMemory()
+        chunks = [{'chunk_id': 1, 'doc_id': 1, 'text': 'Neural networks'}]
+        memory.update_session(1, "What are neural networks?", chunks, ['neural', 'networks'])
+        
+        self.assertTrue(memory.is_follow_up_query(1, "Tell me more"))
+        self.assertTrue(memory.can_reuse_chunks(1, "Tell me more", doc_ids=[1]))
+        
+        # Chunks from documents outside the selection are never reused
+        self.assertFalse(memory.can_reuse_chunks(1, "Tell me more", doc_ids=[2]))
+        
+        # Stale sessions need enough keyword overlap
+        memory.get_session(1).last_updated -= memory.REUSE_WINDOW
+        self.assertFalse(memory.can_reuse_chunks(1, "Tell me more"))
+        memory.get_session(1).update("q", chunks, ['deep'])
+        memory.get_session(1).last_updated -= memory.REUSE_WINDOW
+        self.assertTrue(memory.can_reuse_chunks(1, "deep neural networks"))
+
+
+class RAGQueryTest(TestCase):
+    """Test answer generation in RAGService.query"""
+    
+    def test_reused_chunks_skip_embedding(self):
+        """Test that given chunks are answered without retrieval or a new embedding"""
+        from types import SimpleNamespace
+        from rag.rag_service import RAGService
+        
+        calls = []
+        
+        def embed_queries(texts):
+            calls.append('embed')
+            return np.ones((len(texts), 4), dtype=np.float32)
+        
+        def generate_cached(question, context_parts, prompt, **kwargs):
+            calls.append('cached')
+            return "Cached answer"
+        
+        def generate(prompt, **kwargs):
+            calls.append('generate')
+            return "Answer"
+        
+        service = RAGService()
+        service._embedding_service = SimpleNamespace(_model_name='test', embed_queries=embed_queries)
+        service._llm_service = SimpleNamespace(model='test', generate=generate, generate_cached=generate_cached)
+        chunks = [{'chunk_id': 1, 'doc_id': 1, 'text': 'Neural networks learn', 'score': 0.9}]
+        
+        response = service.query("Tell me more", chunks=chunks)
+        self.assertEqual(response.answer, "Answer")
+        self.assertEqual(calls, ['generate'])
+        
+        # Once retrieval has embedded the question, the answer cache is used
+        calls.clear()
+        service._process_query("Tell me more")
+        self.assertEqual(service.query("Tell me more", chunks=chunks).answer, "Cached answer")
+        self.assertEqual(calls, ['embed', 'cached'])
 
 
 class ContextAssemblerTest(TestCase):
@@ -205,6 +733,22 @@ class ContextAssemblerTest(TestCase):
         # Should only have 2 unique chunks
         self.assertEqual(result.chunks_used, 2)
     
+    def test_overlap_deduplication(self):
+        """Test that highly overlapping chunks are removed"""
+        from rag.context_assembler import ContextAssembler
+        
+        assembler = ContextAssembler()
+        
+        chunks = [
+            {'chunk_id': 1, 'doc_id': 1, 'text': 'alpha beta gamma delta epsilon zeta eta theta'},
+            {'chunk_id': 2, 'doc_id': 1, 'text': 'Theta eta zeta epsilon delta gamma beta alpha iota'},
+            {'chunk_id': 3, 'doc_id': 1, 'text': 'alpha beta'},
+        ]
+        
+        unique = assembler._deduplicate_chunks(chunks)
+        
+        self.assertEqual([c['chunk_id'] for c in unique], [1, 3])
+    
     def test_token_limit(self):
         """Test that context respects token limits"""
         from rag.context_assembler import ContextAssembler
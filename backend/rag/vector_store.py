@@ -4,15 +4,62 @@ Stores and retrieves document embeddings with metadata.
 """
 import os
 import json
+import math
 import pickle
+import queue
+import sqlite3
+import sys
+import threading
+import time
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple, Any
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple, Any, Callable
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass, asdict
 from django.conf import settings
 
 
-@dataclass
+# Embedding function of an add_texts() worker process, set by _init_embed_worker
+_worker_embed_fn = None
+
+
+def _init_embed_worker(embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None):
+    """
+    Set up an embedding worker process.
+    
+    Limits it to one thread so shards don't oversubscribe cores, and loads
+    its embedder once: embed_fn, or else the app's embedding service.
+    """
+    global _worker_embed_fn
+    
+    os.environ['OMP_NUM_THREADS'] = '1'
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    
+    if embed_fn is None:
+        import django
+        from django.apps import apps
+        if not apps.ready:
+            # Spawned workers don't inherit the parent's Django setup
+            django.setup()
+        
+        from .embedding_service import embedding_service
+        embedding_service._load_model()
+        embed_fn = embedding_service.embed_texts
+    
+    _worker_embed_fn = embed_fn
+
+
+def _embed_shard(texts: List[str]) -> np.ndarray:
+    """Embed one shard of texts in a worker process"""
+    return _worker_embed_fn(texts)
+
+
+@dataclass(slots=True)
 class ChunkMetadata:
     """Metadata stored with each chunk in the vector store"""
     doc_id: int
@@ -28,10 +75,21 @@ class ChunkMetadata:
     
     @classmethod
     def from_dict(cls, d: dict) -> 'ChunkMetadata':
+        # Chunk types and section titles repeat across chunks; share one copy
+        for key in ('chunk_type', 'section_title'):
+            if isinstance(d.get(key), str):
+                d[key] = sys.intern(d[key])
         return cls(**d)
+    
+    def __setstate__(self, state):
+        # WAL records written before slots pickled a plain __dict__
+        if isinstance(state, tuple):
+            state = state[1]
+        for name, value in state.items():
+            setattr(self, name, value)
 
 
-@dataclass 
+@dataclass(slots=True)
 class SearchResult:
     """Result from vector search"""
     chunk_id: int
@@ -50,6 +108,19 @@ class SearchResult:
         }
 
 
+@dataclass(slots=True)
+class SearchArrays:
+    """Search results as parallel arrays (one entry per hit, best first)"""
+    chunk_ids: np.ndarray
+    doc_ids: np.ndarray
+    scores: np.ndarray
+    texts: List[str]
+    metadatas: List[ChunkMetadata]
+    
+    def __len__(self) -> int:
+        return len(self.texts)
+
+
 class FAISSVectorStore:
     """
     Vector store using FAISS for efficient similarity search.
@@ -68,26 +139,227 @@ class FAISSVectorStore:
         self.persist_dir = Path(persist_dir or config.get('persist_directory', 'data/vector_store'))
         self.dimension = dimension
         
-        # FAISS index
+        # FAISS index (flat until the corpus is large enough for IVF-PQ)
         self._index = None
+        # 'flat' (exact, converts to IVF-PQ when large) or 'hnsw' (graph
+        # search, no training step, never converted)
+        self.index_type = config.get('index_type', 'flat')
+        self.hnsw_m = config.get('hnsw_m', 32)
+        self.hnsw_ef_construction = config.get('hnsw_ef_construction', 200)
+        self.hnsw_ef_search = config.get('hnsw_ef_search', 64)
+        # Vector count mirrored from index.ntotal, kept in step with every
+        # change so reads don't cross into FAISS on each search
+        self._ntotal = 0
+        self.use_ivfpq = config.get('use_ivfpq', True)
+        # 4-bit codebooks need a larger training sample than 8-bit ones
+        self.ivfpq_threshold = config.get('ivfpq_threshold', 50000)
+        # 4-bit FastScan PQ codes are scanned with SIMD shuffle lookups
+        self.ivfpq_factory = config.get('ivfpq_factory', 'IVF1024,PQ32x4fsr')
+        self.ivfpq_train_size = config.get('ivfpq_train_size', 100000)
+        self.nprobe = config.get('nprobe', 16)
+        # Set while an IVF-PQ index trains outside the lock
+        self._converting = False
         
-        # Metadata storage (id -> metadata)
-        self._metadata: Dict[int, ChunkMetadata] = {}
+        # FastScan indexes can't remove vectors in place; deleted chunks stay
+        # in the index as tombstones until they make up this share of it
+        self._tombstones = 0
+        self.tombstone_compact_ratio = config.get('tombstone_compact_ratio', 0.2)
         
-        # Text storage (id -> chunk text)
-        self._texts: Dict[int, str] = {}
+        # Chunk texts and metadata live in SQLite, read only for search hits
+        self._db_path = self.persist_dir / "chunks.db"
+        # Raw int64 snapshot of the chunk -> doc lookup, memory-mapped on load
+        self._doc_ids_path = self.persist_dir / "doc_ids.i64"
+        self._local = threading.local()
         
-        # ID mapping (internal FAISS id -> chunk_id)
-        self._id_map: List[int] = []
+        # Recently returned (text, metadata) rows, least recently used first,
+        # so hot chunks are served without touching SQLite
+        self.row_cache_size = config.get('row_cache_size', 4096)
+        self._row_cache: OrderedDict[int, Tuple[str, ChunkMetadata]] = OrderedDict()
+        self._row_cache_lock = threading.Lock()
         
-        # Track next ID
+        # Track next ID (chunk IDs are used directly as FAISS ids)
         self._next_id = 0
         
+        # Doc ID of each chunk, indexed by chunk ID (-1 for unused IDs), so
+        # search filtering is array indexing rather than per-hit lookups
+        self._doc_ids_arr = np.empty(0, dtype=np.int64)
+        # Sorted chunk IDs of each document, the inverse of _doc_ids_arr, so
+        # filtered searches and deletes don't scan the whole lookup
+        self._doc_chunks: Dict[int, np.ndarray] = {}
+        
+        # Guards index and metadata against concurrent mutation and saves
+        self._lock = threading.RLock()
+        
+        # Concurrent search_async() calls within this window share one FAISS call
+        self.search_batch_window = config.get('search_batch_window_ms', 5) / 1000
+        self.search_batch_size = config.get('search_batch_size', 32)
+        self._search_queue: queue.Queue = queue.Queue()
+        self._search_worker = None
+        
+        # Write-ahead log of changes since the last full save
+        self._wal_path = self.persist_dir / "index.wal"
+        self.wal_records = 0
+        # Fold the log into a full save once it holds this many records
+        self.wal_compact_records = config.get('wal_compact_records', 100)
+        
         # Ensure persist directory exists
         self.persist_dir.mkdir(parents=True, exist_ok=True)
+        self._init_db()
         
-        # Try to load existing index
+        # Try to load existing index, then replay changes logged after it
         self._load_if_exists()
+        self._replay_wal()
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """Per-thread connection to the chunk database"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self._db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def _init_db(self):
+        """Create the chunk table if needed"""
+        conn = self._get_connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "chunk_id INTEGER PRIMARY KEY, doc_id INTEGER, text TEXT, meta TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks(doc_id)")
+        conn.commit()
+        
+        self._load_doc_ids()
+    
+    def _load_doc_ids(self):
+        """
+        Build the chunk -> doc lookup array.
+        
+        Reads the snapshot written by save() in one sequential read; changes
+        since that save are restored by WAL replay. Stores without a snapshot
+        fall back to a table scan. (Not memory-mapped: a mapped file can't be
+        replaced by the next save on Windows.)
+        """
+        if self._doc_ids_path.exists() and self._doc_ids_path.stat().st_size > 0:
+            self._doc_ids_arr = np.fromfile(self._doc_ids_path, dtype=np.int64)
+            self._doc_chunks = self._group_by_doc(
+                np.flatnonzero(self._doc_ids_arr >= 0), self._doc_ids_arr
+            )
+            return
+        
+        rows = np.array(
+            self._get_connection().execute("SELECT chunk_id, doc_id FROM chunks").fetchall(),
+            dtype=np.int64
+        )
+        if len(rows):
+            self._set_doc_ids(rows[:, 0], rows[:, 1])
+    
+    @staticmethod
+    def _group_by_doc(chunk_ids: np.ndarray, doc_of: np.ndarray) -> Dict[int, np.ndarray]:
+        """Split chunk IDs into sorted arrays per doc ID (doc_of is indexed by chunk ID)"""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        docs = doc_of[chunk_ids]
+        order = np.lexsort((chunk_ids, docs))
+        chunk_ids, docs = chunk_ids[order], docs[order]
+        starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]]) if len(docs) else []
+        return {
+            int(docs[start]): chunk_ids[start:end]
+            for start, end in zip(starts, list(starts[1:]) + [len(docs)])
+        }
+    
+    def _set_doc_ids(self, chunk_ids: np.ndarray, doc_ids: np.ndarray):
+        """Record doc IDs for chunk IDs, growing the lookup array as needed"""
+        # Chunk IDs moving to another document leave their old one
+        known = chunk_ids[chunk_ids < len(self._doc_ids_arr)]
+        previous = self._doc_ids_arr[known]
+        for doc_id in np.unique(previous[previous >= 0]).tolist():
+            if doc_id in self._doc_chunks:
+                kept = np.setdiff1d(self._doc_chunks[doc_id], known, assume_unique=True)
+                if kept.size:
+                    self._doc_chunks[doc_id] = kept
+                else:
+                    del self._doc_chunks[doc_id]
+        
+        needed = int(chunk_ids.max()) + 1 if len(chunk_ids) else 0
+        capacity = len(self._doc_ids_arr)
+        if needed > capacity:
+            # Grow geometrically so repeated adds copy amortized O(1) per chunk;
+            # spare slots hold -1 like any unused chunk ID
+            grown = np.full(max(capacity * 2, needed), -1, dtype=np.int64)
+            grown[:capacity] = self._doc_ids_arr
+            self._doc_ids_arr = grown
+        self._doc_ids_arr[chunk_ids] = doc_ids
+        
+        for doc_id, ids in self._group_by_doc(chunk_ids, self._doc_ids_arr).items():
+            existing = self._doc_chunks.get(doc_id)
+            self._doc_chunks[doc_id] = ids if existing is None else np.union1d(existing, ids)
+    
+    def _write_chunks(self, chunk_ids: List[int], texts: List[str], metadatas: List[ChunkMetadata]):
+        """Insert or replace chunk rows in one transaction"""
+        self._evict_rows(chunk_ids)
+        conn = self._get_connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, doc_id, text, meta) VALUES (?, ?, ?, ?)",
+                [
+                    (chunk_id, meta.doc_id, text, json.dumps(meta.to_dict()))
+                    for chunk_id, text, meta in zip(chunk_ids, texts, metadatas)
+                ]
+            )
+    
+    def _read_chunks(self, chunk_ids: List[int]) -> Dict[int, Tuple[str, ChunkMetadata]]:
+        """Fetch (text, metadata) for chunk IDs, querying SQLite only for cache misses"""
+        if not chunk_ids:
+            return {}
+        
+        found = {}
+        with self._row_cache_lock:
+            for chunk_id in chunk_ids:
+                row = self._row_cache.get(chunk_id)
+                if row is not None:
+                    self._row_cache.move_to_end(chunk_id)
+                    found[chunk_id] = row
+        
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in found]
+        if not missing:
+            return found
+        
+        placeholders = ",".join("?" * len(missing))
+        rows = self._get_connection().execute(
+            f"SELECT chunk_id, text, meta FROM chunks WHERE chunk_id IN ({placeholders})",
+            missing
+        ).fetchall()
+        
+        with self._row_cache_lock:
+            for chunk_id, text, meta in rows:
+                row = (text, ChunkMetadata.from_dict(json.loads(meta)))
+                found[chunk_id] = row
+                if self.row_cache_size > 0:
+                    self._row_cache[chunk_id] = row
+            while len(self._row_cache) > self.row_cache_size:
+                self._row_cache.popitem(last=False)
+        
+        return found
+    
+    def _evict_rows(self, chunk_ids):
+        """Drop cached rows for chunk IDs that are being rewritten or deleted"""
+        with self._row_cache_lock:
+            for chunk_id in chunk_ids:
+                self._row_cache.pop(chunk_id, None)
+    
+    def _existing_ids(self, chunk_ids: List[int]) -> set:
+        """Subset of chunk IDs already stored"""
+        found = set()
+        conn = self._get_connection()
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            found.update(row[0] for row in conn.execute(
+                f"SELECT chunk_id FROM chunks WHERE chunk_id IN ({placeholders})", batch
+            ))
+        return found
     
     def _get_or_create_index(self):
         """Get or create FAISS index"""
@@ -95,9 +367,18 @@ class FAISSVectorStore:
             try:
                 import faiss
                 
-                # Use IndexFlatIP for cosine similarity (assumes normalized vectors)
-                self._index = faiss.IndexFlatIP(self.dimension)
-                print(f"[VectorStore] Created new FAISS index with dimension {self.dimension}")
+                if self.index_type == 'hnsw':
+                    base = faiss.IndexHNSWFlat(self.dimension, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+                    base.hnsw.efConstruction = self.hnsw_ef_construction
+                else:
+                    # Use IndexFlatIP for cosine similarity (vectors are L2-normalized
+                    # on add and search)
+                    base = faiss.IndexFlatIP(self.dimension)
+                
+                # Keyed by chunk ID so vectors can be addressed by ID
+                self._index = faiss.IndexIDMap2(base)
+                self._configure_index()
+                print(f"[VectorStore] Created new {self.index_type} FAISS index with dimension {self.dimension}")
                 
             except ImportError:
                 raise ImportError(
@@ -106,6 +387,156 @@ class FAISSVectorStore:
         
         return self._index
     
+    def _configure_index(self):
+        """Apply search-time parameters to HNSW and IVF indexes"""
+        import faiss
+        
+        if self._is_hnsw():
+            faiss.downcast_index(self._index.index).hnsw.efSearch = self.hnsw_ef_search
+            return
+        
+        try:
+            ivf = faiss.extract_index_ivf(self._index)
+        except RuntimeError:
+            return  # Not an IVF index
+        
+        ivf.nprobe = self.nprobe
+        # Chunk IDs are arbitrary, so reconstruct() needs a hashed direct map
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    
+    def _is_flat(self) -> bool:
+        """Whether the current index is exhaustive (not yet IVF-PQ)"""
+        import faiss
+        return isinstance(self._index, faiss.IndexIDMap2) and not self._is_hnsw()
+    
+    def _is_hnsw(self) -> bool:
+        """Whether the current index is an HNSW graph"""
+        import faiss
+        return (
+            isinstance(self._index, faiss.IndexIDMap2)
+            and isinstance(faiss.downcast_index(self._index.index), faiss.IndexHNSW)
+        )
+    
+    def _supports_remove(self) -> bool:
+        """Whether vectors can be removed in place (HNSW graphs and FastScan block lists can't)"""
+        if self._is_hnsw():
+            return False
+        if self._is_flat():
+            return True
+        
+        import faiss
+        ivf = faiss.extract_index_ivf(self._index)
+        return not isinstance(faiss.downcast_InvertedLists(ivf.invlists), faiss.BlockInvertedLists)
+    
+    def _index_ids(self) -> np.ndarray:
+        """Chunk IDs of every vector in the index, tombstoned ones included"""
+        import faiss
+        
+        if self._index is None:
+            return np.empty(0, dtype=np.int64)
+        if isinstance(self._index, faiss.IndexIDMap2):
+            return faiss.vector_to_array(self._index.id_map)
+        
+        ivf = faiss.extract_index_ivf(self._index)
+        invlists = ivf.invlists
+        return np.concatenate([np.empty(0, dtype=np.int64)] + [
+            faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+            for l in range(ivf.nlist)
+            if invlists.list_size(l)
+        ])
+    
+    def _compact(self):
+        """Rebuild an index without its tombstoned vectors"""
+        hnsw = self._is_hnsw()
+        ids = self._index_ids()
+        
+        in_range = ids < len(self._doc_ids_arr)
+        live = ids[in_range][self._doc_ids_arr[ids[in_range]] >= 0]
+        
+        vectors = self._index.reconstruct_batch(live) if live.size else None
+        if hnsw:
+            # A graph can't drop nodes; build a fresh one
+            self._index = None
+            self._get_or_create_index()
+        else:
+            # IVF indexes keep their trained quantizers
+            self._index.reset()
+        if vectors is not None:
+            self._index.add_with_ids(vectors, live)
+        self._ntotal = int(live.size)
+        self._tombstones = 0
+        
+        print(f"[VectorStore] Compacted index to {self._ntotal} vectors")
+    
+    def _maybe_convert_to_ivfpq(self):
+        """
+        Replace the flat index with a trained IVF-PQ index once the corpus
+        reaches ivfpq_threshold vectors, and enough for FAISS to train every
+        IVF centroid (or ivfpq_train_size, if smaller).
+        
+        Vectors are stored as compact PQ codes and searches only visit
+        nprobe inverted lists, so search cost is sublinear in corpus size.
+        Training runs outside the store lock, so other searches and adds
+        carry on meanwhile; vectors are copied across under the lock.
+        """
+        if not self.use_ivfpq or self._ntotal < self.ivfpq_threshold:
+            return
+        
+        import faiss
+        
+        with self._lock:
+            if self._converting or not self._is_flat():
+                return
+            
+            try:
+                index = faiss.index_factory(self.dimension, self.ivfpq_factory, faiss.METRIC_INNER_PRODUCT)
+            except RuntimeError as e:
+                # e.g. dimension not divisible by the number of PQ subquantizers
+                print(f"[VectorStore] Keeping flat index, invalid IVF-PQ factory: {e}")
+                self.use_ivfpq = False
+                return
+            
+            # FAISS warns and clusters poorly below this many points per centroid
+            min_points = faiss.ClusteringParameters().min_points_per_centroid * faiss.extract_index_ivf(index).nlist
+            n = self._index.ntotal
+            if n < min(min_points, self.ivfpq_train_size):
+                return
+            
+            # Copy out a random training sample of the corpus
+            flat = faiss.downcast_index(self._index.index)
+            vectors = faiss.rev_swig_ptr(flat.get_xb(), n * self.dimension).reshape(n, self.dimension)
+            if n > self.ivfpq_train_size:
+                sample = np.sort(np.random.default_rng(0).choice(n, self.ivfpq_train_size, replace=False))
+                x_train = vectors[sample]
+            else:
+                x_train = vectors.copy()
+            self._converting = True
+        
+        try:
+            index.train(x_train)
+        except RuntimeError as e:
+            print(f"[VectorStore] Keeping flat index, IVF-PQ training failed: {e}")
+            index = None
+        
+        with self._lock:
+            self._converting = False
+            if index is None:
+                self.use_ivfpq = False
+                return
+            if not self._is_flat():
+                return  # Cleared meanwhile
+            
+            # Vectors added or deleted during training are picked up here
+            ids = faiss.vector_to_array(self._index.id_map)
+            vectors = faiss.downcast_index(self._index.index).reconstruct_n(0, self._index.ntotal)
+            
+            # IVF indexes store external ids natively, no IDMap wrapper needed
+            index.add_with_ids(vectors, ids)
+            self._index = index
+            self._configure_index()
+        
+        print(f"[VectorStore] Converted to {self.ivfpq_factory} index with {index.ntotal} vectors")
+    
     def _load_if_exists(self):
         """Load index from disk if it exists"""
         index_path = self.persist_dir / "faiss.index"
@@ -116,49 +547,232 @@ class FAISSVectorStore:
                 import faiss
                 
                 self._index = faiss.read_index(str(index_path))
+                self._relink_fastscan(self._index)
                 
                 with open(metadata_path, 'rb') as f:
                     data = pickle.load(f)
-                    self._metadata = data.get('metadata', {})
-                    self._texts = data.get('texts', {})
-                    self._id_map = data.get('id_map', [])
                     self._next_id = data.get('next_id', 0)
                     self.dimension = data.get('dimension', self.dimension)
+                    self._tombstones = data.get('tombstones', 0)
+                    
+                    # Older snapshots index by position with a separate id_map
+                    if 'id_map' in data:
+                        self._index = self._with_chunk_ids(self._index, data['id_map'])
+                    
+                    # Older snapshots pickle texts and metadata; move them to SQLite
+                    if 'metadata' in data:
+                        metadata = data['metadata']
+                        texts = data.get('texts', {})
+                        ids = list(metadata)
+                        self._write_chunks(ids, [texts.get(cid, "") for cid in ids], [metadata[cid] for cid in ids])
+                        self._set_doc_ids(
+                            np.asarray(ids, dtype=np.int64),
+                            np.asarray([metadata[cid].doc_id for cid in ids], dtype=np.int64)
+                        )
                 
-                print(f"[VectorStore] Loaded index with {self._index.ntotal} vectors")
+                self._configure_index()
+                self._ntotal = self._index.ntotal
+                
+                print(f"[VectorStore] Loaded index with {self._ntotal} vectors")
                 
             except Exception as e:
                 print(f"[VectorStore] Failed to load index: {e}")
                 self._index = None
     
-    def save(self):
-        """Persist the index and metadata to disk"""
-        if self._index is None or self._index.ntotal == 0:
-            return
+    @staticmethod
+    def _relink_fastscan(index):
+        """
+        Point a loaded IVF-PQ FastScan index back at its own PQ.
+        
+        read_index() leaves fine_quantizer unset on these indexes, so
+        reconstruct() (and with it compaction) would dereference a null
+        pointer and crash the process.
+        """
+        import faiss
         
         try:
-            import faiss
-            
-            index_path = self.persist_dir / "faiss.index"
-            metadata_path = self.persist_dir / "metadata.pkl"
-            
-            # Save FAISS index
-            faiss.write_index(self._index, str(index_path))
+            ivf = faiss.downcast_index(faiss.extract_index_ivf(index))
+        except RuntimeError:
+            return  # Not an IVF index
+        
+        if isinstance(ivf, faiss.IndexIVFPQFastScan) and ivf.fine_quantizer is None:
+            ivf.fine_quantizer = ivf.pq
+    
+    @staticmethod
+    def _with_chunk_ids(index, id_map: List[int]):
+        """Convert a positionally indexed index to one keyed by chunk ID"""
+        import faiss
+        
+        ids = np.asarray(id_map, dtype=np.int64)
+        
+        try:
+            ivf = faiss.extract_index_ivf(index)
+        except RuntimeError:
+            ivf = None
+        
+        if ivf is None:
+            vectors = index.reconstruct_n(0, index.ntotal)
+            keyed = faiss.IndexIDMap2(faiss.IndexFlatIP(index.d))
+            keyed.add_with_ids(vectors, ids)
+            return keyed
+        
+        # IVF indexes keep their trained quantizers and take ids natively
+        ivf.make_direct_map()
+        vectors = index.reconstruct_n(0, index.ntotal)
+        index.reset()
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        index.add_with_ids(vectors, ids)
+        return index
+    
+    @property
+    def wal_needs_compaction(self) -> bool:
+        """Whether the log has grown enough to warrant a full save"""
+        return self.wal_records >= self.wal_compact_records
+    
+    def _write_wal(self, record: dict):
+        """Append one record to the write-ahead log and flush it to disk"""
+        with self._lock:
+            with open(self._wal_path, 'ab') as f:
+                pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            self.wal_records += 1
+    
+    def _replay_wal(self):
+        """
+        Apply write-ahead log records on top of the loaded snapshot.
+        
+        Replay is idempotent: the snapshot may already hold some logged
+        changes (a crash between swapping in the snapshot and dropping the
+        log), so vectors already in the index aren't added again.
+        """
+        if not self._wal_path.exists():
+            return
+        
+        present = set(self._index_ids().tolist())
+        replayed = 0
+        with open(self._wal_path, 'rb') as f:
+            while True:
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception as e:
+                    # A torn final write; everything before it is intact
+                    print(f"[VectorStore] Stopped WAL replay at a corrupt record: {e}")
+                    break
+                
+                if record['op'] == 'add':
+                    self._add(record['embeddings'], record['texts'], record['metadatas'], present=present)
+                elif record['op'] == 'delete':
+                    present.difference_update(self._delete_doc(record['doc_id']).tolist())
+                replayed += 1
+        
+        self.wal_records = replayed
+        if replayed:
+            print(f"[VectorStore] Replayed {replayed} WAL records")
+            self._maybe_convert_to_ivfpq()
+    
+    def save(self):
+        """Persist the index and metadata to disk"""
+        with self._lock:
+            if self._index is None or self._ntotal == 0:
+                return
             
-            # Save metadata
-            with open(metadata_path, 'wb') as f:
-                pickle.dump({
-                    'metadata': self._metadata,
-                    'texts': self._texts,
-                    'id_map': self._id_map,
+            try:
+                import faiss
+                
+                index_path = self.persist_dir / "faiss.index"
+                metadata_path = self.persist_dir / "metadata.pkl"
+                
+                # Save index state (texts and metadata are already in SQLite)
+                state = {
                     'next_id': self._next_id,
                     'dimension': self.dimension,
-                }, f)
-            
-            print(f"[VectorStore] Saved index with {self._index.ntotal} vectors")
+                    'tombstones': self._tombstones,
+                }
+                
+                # Write and flush every file before swapping any in, so a
+                # failed write leaves the previous snapshot untouched. A crash
+                # between swaps leaves the log in place, and replaying it on
+                # top of a partly swapped snapshot is idempotent.
+                staged = [
+                    (self._doc_ids_path, self._write_synced(
+                        self._doc_ids_path,
+                        lambda tmp: np.ascontiguousarray(self._doc_ids_arr).tofile(tmp)
+                    )),
+                    (metadata_path, self._write_synced(
+                        metadata_path,
+                        lambda tmp: tmp.write_bytes(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+                    )),
+                    (index_path, self._write_synced(
+                        index_path,
+                        lambda tmp: faiss.write_index(self._index, str(tmp))
+                    )),
+                ]
+                for path, tmp_path in staged:
+                    os.replace(tmp_path, path)
+                
+                # Snapshot now covers everything in the log
+                self._wal_path.unlink(missing_ok=True)
+                self.wal_records = 0
+                
+                print(f"[VectorStore] Saved index with {self._ntotal} vectors")
+                
+            except Exception as e:
+                print(f"[VectorStore] Failed to save index: {e}")
+    
+    @staticmethod
+    def _write_synced(path: Path, write: Callable[[Path], Any]) -> Path:
+        """Write a file beside path and flush it to disk, returning its path"""
+        tmp_path = path.with_name(path.name + '.tmp')
+        write(tmp_path)
+        with open(tmp_path, 'rb+') as f:
+            os.fsync(f.fileno())
+        return tmp_path
+    
+    def add_texts(
+        self,
+        texts: List[str],
+        metadatas: List[ChunkMetadata],
+        embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None,
+        num_workers: Optional[int] = None
+    ) -> List[int]:
+        """
+        Embed texts across worker processes, then add them to the store.
+        
+        Every call starts its workers and loads an embedder in each, so this
+        suits bulk loads rather than single documents.
+        
+        Args:
+            texts: List of chunk texts
+            metadatas: List of ChunkMetadata objects
+            embed_fn: Picklable function mapping a list of texts to embeddings
+                (default: the app's embedding service, loaded in each worker)
+            num_workers: Worker processes (default: half the CPU cores)
             
-        except Exception as e:
-            print(f"[VectorStore] Failed to save index: {e}")
+        Returns:
+            List of assigned chunk IDs
+        """
+        if not texts:
+            return []
+        
+        num_workers = min(num_workers or max((os.cpu_count() or 2) // 2, 1), len(texts))
+        
+        if num_workers <= 1:
+            if embed_fn is None:
+                from .embedding_service import embedding_service
+                embed_fn = embedding_service.embed_texts
+            embeddings = embed_fn(texts)
+        else:
+            shard_size = -(-len(texts) // num_workers)
+            shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+            with ProcessPoolExecutor(
+                max_workers=len(shards), initializer=_init_embed_worker, initargs=(embed_fn,)
+            ) as pool:
+                embeddings = np.vstack(list(pool.map(_embed_shard, shards)))
+        
+        return self.add(embeddings, texts, metadatas)
     
     def add(
         self,
@@ -170,47 +784,105 @@ class FAISSVectorStore:
         Add embeddings with metadata to the store.
         
         Args:
-            embeddings: Array of shape (n, dimension)
+            embeddings: Array of shape (n, dimension); a writable C-contiguous
+                float32 array is L2-normalized in place rather than copied
             texts: List of chunk texts
             metadatas: List of ChunkMetadata objects
             
         Returns:
             List of assigned chunk IDs
         """
+        chunk_ids = self._add(embeddings, texts, metadatas)
+        self._maybe_convert_to_ivfpq()
+        return chunk_ids
+    
+    def _add(
+        self,
+        embeddings: np.ndarray,
+        texts: List[str],
+        metadatas: List[ChunkMetadata],
+        present: Optional[set] = None
+    ) -> List[int]:
+        """
+        Add vectors, logging the add to the WAL before applying it.
+        
+        present is only passed by WAL replay: the chunk IDs already in the
+        index, whose vectors are skipped. Replayed chunk IDs are kept as
+        logged; live adds replace missing or taken ones.
+        """
+        assign_ids = present is None
         if len(embeddings) == 0:
             return []
         
         if len(embeddings) != len(texts) or len(embeddings) != len(metadatas):
             raise ValueError("embeddings, texts, and metadatas must have same length")
         
-        # Ensure embeddings are float32
-        embeddings = embeddings.astype(np.float32)
-        
-        # Check dimension
-        if embeddings.shape[1] != self.dimension:
-            if self._index is None or self._index.ntotal == 0:
-                # Update dimension if index is empty
-                self.dimension = embeddings.shape[1]
-            else:
-                raise ValueError(f"Embedding dimension {embeddings.shape[1]} != index dimension {self.dimension}")
-        
-        index = self._get_or_create_index()
+        import faiss
         
-        # Generate IDs
-        chunk_ids = []
-        for i, meta in enumerate(metadatas):
-            chunk_id = meta.chunk_id if meta.chunk_id else self._next_id
-            self._next_id = max(self._next_id, chunk_id + 1)
+        with self._lock:
+            # Use the caller's buffer when it is already float32 and C-ordered;
+            # anything else (or a read-only array) is copied once
+            if (
+                embeddings.dtype != np.float32
+                or not embeddings.flags['C_CONTIGUOUS']
+                or not embeddings.flags['WRITEABLE']
+            ):
+                embeddings = np.array(embeddings, dtype=np.float32, order='C')
             
-            chunk_ids.append(chunk_id)
-            self._id_map.append(chunk_id)
-            self._metadata[chunk_id] = meta
-            self._texts[chunk_id] = texts[i]
-        
-        # Add to FAISS index
-        index.add(embeddings)
-        
-        print(f"[VectorStore] Added {len(embeddings)} vectors. Total: {index.ntotal}")
+            # Check dimension
+            if embeddings.shape[1] != self.dimension:
+                if self._index is None or self._ntotal == 0:
+                    # Update dimension if index is empty
+                    self.dimension = embeddings.shape[1]
+                else:
+                    raise ValueError(f"Embedding dimension {embeddings.shape[1]} != index dimension {self.dimension}")
+            
+            index = self._get_or_create_index()
+            
+            # Inner product equals cosine similarity only for unit vectors
+            faiss.normalize_L2(embeddings)
+            
+            # Generate IDs; they key the FAISS index, so they must be unique
+            taken = self._existing_ids([m.chunk_id for m in metadatas]) if assign_ids else set()
+            chunk_ids = []
+            for meta in metadatas:
+                chunk_id = meta.chunk_id
+                if assign_ids and (not chunk_id or chunk_id in taken):
+                    chunk_id = meta.chunk_id = self._next_id
+                self._next_id = max(self._next_id, chunk_id + 1)
+                
+                taken.add(chunk_id)
+                chunk_ids.append(chunk_id)
+            ids = np.asarray(chunk_ids, dtype=np.int64)
+            
+            if assign_ids:
+                # Logged under the lock, so a concurrent save() either
+                # includes this add or leaves its record in the log
+                self._write_wal({
+                    'op': 'add',
+                    'embeddings': embeddings,
+                    'texts': list(texts),
+                    'metadatas': list(metadatas),
+                })
+            
+            # Rows and lookups are overwritten in place, so replaying is harmless
+            self._write_chunks(chunk_ids, texts, metadatas)
+            self._set_doc_ids(
+                ids,
+                np.fromiter((m.doc_id for m in metadatas), dtype=np.int64, count=len(metadatas))
+            )
+            
+            if present is not None:
+                fresh = np.fromiter((chunk_id not in present for chunk_id in chunk_ids), dtype=bool, count=len(ids))
+                embeddings, ids = embeddings[fresh], ids[fresh]
+                present.update(ids.tolist())
+            
+            # Add to FAISS index
+            if len(ids):
+                index.add_with_ids(embeddings, ids)
+            self._ntotal += len(ids)
+            
+            print(f"[VectorStore] Added {len(ids)} vectors. Total: {self._ntotal}")
         
         return chunk_ids
     
@@ -233,134 +905,355 @@ class FAISSVectorStore:
         Returns:
             List of SearchResult objects
         """
-        if self._index is None or self._index.ntotal == 0:
-            return []
+        hits = self.search_arrays(query_embedding, k=k, doc_ids=doc_ids, min_score=min_score)
         
-        # Reshape query if needed
-        query_embedding = query_embedding.astype(np.float32)
-        if query_embedding.ndim == 1:
-            query_embedding = query_embedding.reshape(1, -1)
+        return [
+            SearchResult(
+                chunk_id=chunk_id,
+                doc_id=doc_id,
+                score=score,
+                text=text,
+                metadata=metadata
+            )
+            for chunk_id, doc_id, score, text, metadata in zip(
+                hits.chunk_ids.tolist(), hits.doc_ids.tolist(), hits.scores.tolist(),
+                hits.texts, hits.metadatas
+            )
+        ]
+    
+    def search_arrays(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        doc_ids: Optional[List[int]] = None,
+        min_score: float = 0.0
+    ) -> SearchArrays:
+        """
+        Search for similar vectors, returning hits as parallel arrays.
         
-        # Search more than k if filtering by doc_ids
-        search_k = k * 3 if doc_ids else k
-        search_k = min(search_k, self._index.ntotal)
+        Same filtering as search(), without building a SearchResult per hit.
         
-        # Run FAISS search
-        scores, indices = self._index.search(query_embedding, search_k)
+        Args:
+            query_embedding: Query vector of shape (dimension,)
+            k: Number of results to return
+            doc_ids: Optional filter to specific documents
+            min_score: Minimum similarity score threshold
+            
+        Returns:
+            SearchArrays with chunk_ids, doc_ids, scores, texts and metadatas
+        """
+        if self._index is None or self._ntotal == 0:
+            return self._make_search_arrays([], [], [], [], [])
         
-        results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < 0 or idx >= len(self._id_map):
-                continue
+        selector = self._doc_selector(doc_ids) if doc_ids else None
+        if doc_ids and selector is None:
+            return self._make_search_arrays([], [], [], [], [])  # No chunks in those documents
+        
+        return self._search_one(
+            self._prepare_queries(query_embedding), k, doc_ids, min_score, selector,
+            self._search_k(k, doc_ids)
+        )
+    
+    def _search_one(self, query, k, doc_ids, min_score, selector, search_k) -> SearchArrays:
+        """Search one prepared query, widening the search while tombstones crowd out hits"""
+        while True:
+            scores, indices = self._index.search(query, search_k, params=self._search_params(selector))
+            hits = self._collect_hits(indices[0], scores[0], k, doc_ids, min_score)
+            if not self._needs_wider(hits, k, indices[0], scores[0], min_score):
+                return hits
+            search_k = min(search_k * 2, self._ntotal)
+    
+    def _needs_wider(self, hits: SearchArrays, k: int, ids: np.ndarray, sc: np.ndarray, min_score: float) -> bool:
+        """Whether fetching more candidates could still fill a short result"""
+        return (
+            len(hits) < k
+            and self._tombstones > 0
+            and 0 < len(ids) < self._ntotal
+            # Not once FAISS runs out of candidates or they drop below min_score
+            and ids[-1] >= 0
+            and sc[-1] >= min_score
+        )
+    
+    def search_async(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        doc_ids: Optional[List[int]] = None,
+        min_score: float = 0.0
+    ) -> Future:
+        """
+        Queue a search to run batched with concurrent callers.
+        
+        Queries arriving within search_batch_window_ms share one FAISS call
+        over a stacked query matrix. A window of 0 searches synchronously.
+        
+        Returns:
+            Future resolving to the same SearchArrays as search_arrays()
+        """
+        future = Future()
+        
+        if self.search_batch_window <= 0 or self.search_batch_size <= 1:
+            try:
+                future.set_result(self.search_arrays(query_embedding, k, doc_ids, min_score))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        
+        self._ensure_search_worker()
+        self._search_queue.put((query_embedding, k, doc_ids, min_score, future))
+        return future
+    
+    def _ensure_search_worker(self):
+        """Start the search batching thread on first use"""
+        if self._search_worker is not None:
+            return
+        with self._lock:
+            if self._search_worker is None:
+                self._search_worker = threading.Thread(
+                    target=self._run_search_batches, name='vector-search-batcher', daemon=True
+                )
+                self._search_worker.start()
+    
+    def _run_search_batches(self):
+        """Drain queued searches in batches of up to search_batch_size"""
+        while True:
+            batch = [self._search_queue.get()]
+            deadline = time.monotonic() + self.search_batch_window
             
-            chunk_id = self._id_map[idx]
-            metadata = self._metadata.get(chunk_id)
+            while len(batch) < self.search_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._search_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
             
-            if metadata is None:
-                continue
+            try:
+                self._search_batch(batch)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    def _search_batch(self, batch: list):
+        """Answer queued searches with one FAISS call per document filter"""
+        # Queries restricted to the same documents share a selector
+        groups: Dict[Optional[tuple], list] = {}
+        for request in batch:
+            doc_ids = request[2]
+            groups.setdefault(tuple(sorted(doc_ids)) if doc_ids else None, []).append(request)
+        
+        for doc_key, requests in groups.items():
+            selector = self._doc_selector(doc_key) if doc_key else None
             
-            # Apply filters
-            if score < min_score:
+            if self._index is None or self._ntotal == 0 or (doc_key and selector is None):
+                for *_, future in requests:
+                    future.set_result(self._make_search_arrays([], [], [], [], []))
                 continue
             
-            if doc_ids and metadata.doc_id not in doc_ids:
-                continue
+            queries = self._prepare_queries(np.vstack([
+                np.asarray(query, dtype=np.float32).reshape(1, -1) for query, *_ in requests
+            ]))
+            row_ks = [self._search_k(k, doc_ids) for _, k, doc_ids, _, _ in requests]
             
-            results.append(SearchResult(
-                chunk_id=chunk_id,
-                doc_id=metadata.doc_id,
-                score=float(score),
-                text=self._texts.get(chunk_id, ""),
-                metadata=metadata
-            ))
+            scores, indices = self._index.search(
+                queries, max(row_ks), params=self._search_params(selector)
+            )
             
-            if len(results) >= k:
-                break
-        
-        return results
+            # Each row's top max(row_ks) starts with its own top search_k
+            for row, ((_, k, doc_ids, min_score, future), search_k) in enumerate(zip(requests, row_ks)):
+                try:
+                    ids, sc = indices[row, :search_k], scores[row, :search_k]
+                    hits = self._collect_hits(ids, sc, k, doc_ids, min_score)
+                    if self._needs_wider(hits, k, ids, sc, min_score):
+                        hits = self._search_one(
+                            queries[row:row + 1], k, doc_ids, min_score, selector,
+                            min(search_k * 2, self._ntotal)
+                        )
+                    future.set_result(hits)
+                except Exception as e:
+                    future.set_exception(e)
     
-    def delete_by_doc_id(self, doc_id: int):
-        """
-        Delete all vectors for a document.
-        Note: FAISS doesn't support deletion efficiently, so we rebuild the index.
-        
-        Args:
-            doc_id: Document ID to delete
-        """
-        if self._index is None or self._index.ntotal == 0:
-            return
+    def _prepare_queries(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Float32 (n, dimension) copy of the queries, L2-normalized"""
+        import faiss
         
-        # Find chunk IDs to keep
-        keep_ids = [cid for cid, meta in self._metadata.items() if meta.doc_id != doc_id]
+        # Reshape query if needed
+        query_embedding = query_embedding.astype(np.float32)
+        if query_embedding.ndim == 1:
+            query_embedding = query_embedding.reshape(1, -1)
+        faiss.normalize_L2(query_embedding)
+        return query_embedding
+    
+    def _search_k(self, k: int, doc_ids: Optional[List[int]]) -> int:
+        """Candidates to fetch from FAISS for k filtered results"""
+        if doc_ids or not self._tombstones:
+            # The selector already limits FAISS to live chunks of doc_ids
+            return min(k, self._ntotal)
+        # Tombstoned vectors still come back from FAISS. They are at most
+        # tombstone_compact_ratio of the index, so fetch that share extra;
+        # searches that still come up short are widened and retried
+        return min(k + math.ceil(k * self.tombstone_compact_ratio), self._ntotal)
+    
+    def _doc_selector(self, doc_ids):
+        """FAISS selector over the live chunk IDs of doc_ids, or None if there are none"""
+        import faiss
         
-        if len(keep_ids) == len(self._metadata):
-            return  # Nothing to delete
+        parts = [self._doc_chunks[d] for d in set(doc_ids) if d in self._doc_chunks]
+        if not parts:
+            return None
+        chunk_ids = np.ascontiguousarray(np.concatenate(parts), dtype=np.int64)
+        # IDSelectorBatch copies the IDs into its own hash set
+        return faiss.IDSelectorBatch(chunk_ids.size, faiss.swig_ptr(chunk_ids))
+    
+    def _search_params(self, selector):
+        """Search parameters applying selector inside FAISS (None without one)"""
+        if selector is None:
+            return None
         
-        # Rebuild index with remaining vectors
-        self._rebuild_index(keep_ids)
+        import faiss
         
-        print(f"[VectorStore] Deleted vectors for doc_id={doc_id}")
+        if self._is_flat():
+            return faiss.SearchParameters(sel=selector)
+        if self._is_hnsw():
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self.hnsw_ef_search)
+        # Passing IVF parameters replaces the index's own nprobe
+        return faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
     
-    def _rebuild_index(self, keep_ids: List[int]):
-        """Rebuild index with only specified chunk IDs"""
-        import faiss
+    def _collect_hits(
+        self,
+        ids: np.ndarray,
+        sc: np.ndarray,
+        k: int,
+        doc_ids: Optional[List[int]],
+        min_score: float
+    ) -> SearchArrays:
+        """Filter one query's FAISS candidates and attach texts and metadata"""
+        chunk_ids, hit_doc_ids, hit_scores, texts, metadatas = [], [], [], [], []
         
-        # Collect vectors and metadata to keep
-        new_embeddings = []
-        new_texts = {}
-        new_metadata = {}
-        new_id_map = []
+        # Apply filters over the whole candidate list at once
+        mask = (ids >= 0) & (ids < len(self._doc_ids_arr)) & (sc >= min_score)
+        ids, sc = ids[mask], sc[mask]
         
-        old_index = self._index
+        cand_docs = self._doc_ids_arr[ids]
+        mask = cand_docs >= 0
+        if doc_ids:
+            mask &= np.isin(cand_docs, np.asarray(doc_ids, dtype=np.int64))
+        ids, sc = ids[mask][:k], sc[mask][:k]
         
-        for i, chunk_id in enumerate(self._id_map):
-            if chunk_id in keep_ids:
-                # Get vector from old index
-                vec = old_index.reconstruct(i)
-                new_embeddings.append(vec)
-                new_id_map.append(chunk_id)
-                new_texts[chunk_id] = self._texts.get(chunk_id, "")
-                new_metadata[chunk_id] = self._metadata.get(chunk_id)
+        # Fetch texts and metadata for the surviving hits in one query
+        rows = self._read_chunks(ids.tolist())
         
-        # Create new index
-        self._index = faiss.IndexFlatIP(self.dimension)
+        for score, chunk_id in zip(sc.tolist(), ids.tolist()):
+            row = rows.get(chunk_id)
+            
+            if row is None:
+                continue
+            
+            text, metadata = row
+            chunk_ids.append(chunk_id)
+            hit_doc_ids.append(metadata.doc_id)
+            hit_scores.append(score)
+            texts.append(text)
+            metadatas.append(metadata)
         
-        if new_embeddings:
-            embeddings_array = np.array(new_embeddings, dtype=np.float32)
-            self._index.add(embeddings_array)
+        return self._make_search_arrays(chunk_ids, hit_doc_ids, hit_scores, texts, metadatas)
+    
+    @staticmethod
+    def _make_search_arrays(chunk_ids, doc_ids, scores, texts, metadatas) -> SearchArrays:
+        """Pack per-hit lists into a SearchArrays"""
+        return SearchArrays(
+            chunk_ids=np.asarray(chunk_ids, dtype=np.int64),
+            doc_ids=np.asarray(doc_ids, dtype=np.int64),
+            scores=np.asarray(scores, dtype=np.float32),
+            texts=texts,
+            metadatas=metadatas
+        )
+    
+    def delete_by_doc_id(self, doc_id: int):
+        """
+        Delete all vectors for a document in place.
         
-        self._texts = new_texts
-        self._metadata = new_metadata
-        self._id_map = new_id_map
+        Args:
+            doc_id: Document ID to delete
+        """
+        self._delete_doc(doc_id, log=True)
+    
+    def _delete_doc(self, doc_id: int, log: bool = False) -> np.ndarray:
+        """Delete a document's vectors, returning the deleted chunk IDs"""
+        import faiss
+        
+        with self._lock:
+            if self._index is None or self._ntotal == 0:
+                return np.empty(0, dtype=np.int64)
+            
+            victim_ids = self._doc_chunks.get(doc_id)
+            if victim_ids is None:
+                return np.empty(0, dtype=np.int64)  # Nothing to delete
+            
+            if log:
+                self._write_wal({'op': 'delete', 'doc_id': doc_id})
+            
+            removable = self._supports_remove()
+            if removable:
+                # IVF hashed direct maps only accept an array selector
+                selector_cls = faiss.IDSelectorBatch if self._is_flat() else faiss.IDSelectorArray
+                self._ntotal -= self._index.remove_ids(selector_cls(victim_ids.size, faiss.swig_ptr(victim_ids)))
+            else:
+                # Masked out of results by the doc ID lookup below
+                self._tombstones += int(victim_ids.size)
+            
+            with self._get_connection() as conn:
+                conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            self._evict_rows(victim_ids.tolist())
+            self._doc_ids_arr[victim_ids] = -1
+            del self._doc_chunks[doc_id]
+            
+            if not removable and self._tombstones > self.tombstone_compact_ratio * self._ntotal:
+                self._compact()
+            
+            print(f"[VectorStore] Deleted vectors for doc_id={doc_id}")
+            return victim_ids
     
     def get_doc_chunk_count(self, doc_id: int) -> int:
         """Get number of chunks indexed for a document"""
-        return sum(1 for meta in self._metadata.values() if meta.doc_id == doc_id)
+        return self._get_connection().execute(
+            "SELECT COUNT(*) FROM chunks WHERE doc_id = ?", (doc_id,)
+        ).fetchone()[0]
     
     def get_total_count(self) -> int:
         """Get total number of indexed vectors"""
-        if self._index is None:
-            return 0
-        return self._index.ntotal
+        return self._ntotal - self._tombstones
     
     def clear(self):
         """Clear the entire index"""
-        self._index = None
-        self._metadata = {}
-        self._texts = {}
-        self._id_map = []
-        self._next_id = 0
-        
-        # Delete persisted files
-        index_path = self.persist_dir / "faiss.index"
-        metadata_path = self.persist_dir / "metadata.pkl"
-        
-        if index_path.exists():
-            index_path.unlink()
-        if metadata_path.exists():
-            metadata_path.unlink()
-        
-        print("[VectorStore] Index cleared")
+        with self._lock:
+            self._index = None
+            self._ntotal = 0
+            self._next_id = 0
+            self._tombstones = 0
+            self._doc_ids_arr = np.empty(0, dtype=np.int64)
+            self._doc_chunks = {}
+            
+            with self._get_connection() as conn:
+                conn.execute("DELETE FROM chunks")
+            with self._row_cache_lock:
+                self._row_cache.clear()
+            
+            # Delete persisted files
+            index_path = self.persist_dir / "faiss.index"
+            metadata_path = self.persist_dir / "metadata.pkl"
+            
+            if index_path.exists():
+                index_path.unlink()
+            if metadata_path.exists():
+                metadata_path.unlink()
+            self._doc_ids_path.unlink(missing_ok=True)
+            self._wal_path.unlink(missing_ok=True)
+            self.wal_records = 0
+            
+            print("[VectorStore] Index cleared")
 
 
 # Global singleton instance
@@ -1,15 +1,131 @@
+import hashlib
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Stream multipart bodies from disk when requests-toolbelt is installed;
+# plain requests builds the whole body in memory
+try:
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+except ImportError:
+    MultipartEncoder = None
 
 url = 'http://localhost:8000/api/documents/'
 file_path = 'test_doc.txt'
 notebook_id = '0b1a62f2-91ef-4d3c-84d3-f0d862444b71'
 
-files = {'file': open(file_path, 'rb')}
-data = {'notebook': notebook_id}
+# One pooled session reused for every upload (keep-alive, retried connects)
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.2)
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
 
-try:
-    response = requests.post(url, files=files, data=data)
-    print(f"Status Code: {response.status_code}")
-    print(f"Response: {response.text}")
-except Exception as e:
-    print(f"Error: {e}")
+
+def upload(path, notebook):
+    """Upload one file to a notebook, closing the file afterwards"""
+    with open(path, 'rb') as f:
+        if MultipartEncoder is None:
+            return SESSION.post(url, files={'file': f}, data={'notebook': notebook}, timeout=(3, 30))
+        
+        encoder = MultipartEncoder(fields={
+            'notebook': notebook,
+            'file': (os.path.basename(path), f, 'application/octet-stream'),
+        })
+        return SESSION.post(
+            url,
+            data=encoder,
+            headers={'Content-Type': encoder.content_type},
+            timeout=(3, 30)
+        )
+
+
+class HashingMultipartBody:
+    """
+    multipart/form-data body that SHA-256 hashes the file while it streams.
+    
+    The file is read once; its digest is sent as a trailing `sha256` field
+    (headers go out before the body, so it can't be a header). Has a known
+    length, so requests sends Content-Length rather than chunked encoding.
+    """
+    
+    def __init__(self, path, fields, chunk_size=1 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.sha256 = None
+        
+        head = ''.join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        )
+        head += (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="file"; filename="{os.path.basename(path)}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'
+        )
+        self._head = head.encode()
+        self._length = len(self._head) + os.path.getsize(path) + len(self._tail('0' * 64))
+    
+    def _tail(self, digest):
+        return (
+            f'\r\n--{self.boundary}\r\nContent-Disposition: form-data; name="sha256"\r\n\r\n'
+            f'{digest}\r\n--{self.boundary}--\r\n'
+        ).encode()
+    
+    def __len__(self):
+        return self._length
+    
+    def __iter__(self):
+        # Fresh hash per pass, so a retried send stays correct
+        digest = hashlib.sha256()
+        yield self._head
+        with open(self.path, 'rb') as f:
+            while chunk := f.read(self.chunk_size):
+                digest.update(chunk)
+                yield chunk
+        self.sha256 = digest.hexdigest()
+        yield self._tail(self.sha256)
+
+
+def upload_hashed(path, notebook):
+    """Upload one file, hashing it in the same pass; returns (response, sha256)"""
+    body = HashingMultipartBody(path, {'notebook': notebook})
+    response = SESSION.post(
+        url,
+        data=body,
+        headers={'Content-Type': body.content_type},
+        timeout=(3, 30)
+    )
+    return response, body.sha256
+
+
+def upload_many(paths, notebook, workers=16):
+    """
+    Upload files concurrently, returning responses in input order.
+
+    Each file is opened only while its upload runs, so at most `workers`
+    handles are open; keep workers <= the adapter's pool_maxsize.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(lambda path: upload(path, notebook), paths))
+
+
+if __name__ == '__main__':
+    # Upload files named on the command line, or the sample document
+    paths = sys.argv[1:] or [file_path]
+    try:
+        for path, response in zip(paths, upload_many(paths, notebook_id)):
+            print(f"{path} - Status Code: {response.status_code}")
+            print(f"Response: {response.text}")
+    except Exception as e:
+        print(f"Error: {e}")